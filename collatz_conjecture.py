@@ -10,38 +10,558 @@ odd numbers, multiply by 3 and add 1.
 ### Usage 1:
 
 ```bash
-python collatz_conjecture.py 7
+python collatz_conjecture.py 7 [-l | -p]
+python collatz_conjecture.py search START STOP [-k SIEVE_BITS] [-c CHUNK_SIZE] [-w WORKERS] [-cp CHECKPOINT]
 ```
 
+The `search` subcommand prints the glide records of [START, STOP), i.e. the
+integers whose stopping time in the strict sense (steps until the trajectory
+first drops below the starting value) exceeds that of every smaller integer
+of the range.
+
 ### Usage 2:
 
 ```python
 import collatz_conjecture
 n: int = 7
 generated: list[int] = collatz_conjecture.generate(n)
+for value in collatz_conjecture.iter_trajectory(n):  # Lazily, for huge n
+    ...
+length: int = collatz_conjecture.get_length(n)  # O(1) memory
+peak: int = collatz_conjecture.get_peak(n)  # O(1) memory
+```
+
+### Usage 3:
+
+```python
+import collatz_conjecture
+stats = collatz_conjecture.stopping_times(1, 10 ** 6)
+stats.times[n - 1]  # Stopping time (`len(generate(n))`) of each n in [1, 10 ** 6)
+stats.argmax, stats.max_time  # Smallest n with the longest trajectory
+stats.argpeak, stats.peak  # Smallest n with the highest value reached
+
+# Persistent, memory-mapped cache: extended by 1 writer, shared read-only by any number of readers
+with collatz_conjecture.StoppingTimeCache("stopping_times.bin") as cache:
+    stats = collatz_conjecture.stopping_times(1, 10 ** 6, cache=cache)  # No peak with a cache
+with collatz_conjecture.StoppingTimeCache("stopping_times.bin", readonly=True) as cache:
+    cache[n]  # Same as `len(generate(n))`
+```
+
+### Usage 4 (requires `numpy`):
+
+```python
+import collatz_conjecture
+import numpy as np
+times = collatz_conjecture.batch_stopping_times(np.arange(1, 10 ** 7))
 ```
 """
 
 import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional, Sequence, TextIO
+
+if TYPE_CHECKING:  # NumPy is optional, and only imported by the functions that use it
+    import numpy as np
+
+CACHE_SIZE = 1 << 16
+TABLE_SIZE = 1 << 20
+CHUNK_SIZE = 1 << 10
+SIEVE_BITS = 16
+JUMP_BITS = 12
+SEARCH_CHUNK_SIZE = 1 << 20
+CACHE_HEADER_SIZE = 32
+
+
+class RangeStats(NamedTuple):
+    times: array
+    argmax: int
+    max_time: int
+    argpeak: Optional[int]
+    peak: Optional[int]
 
 
 def generate(n: int) -> list[int]:
+    return list(iter_trajectory(n))
+
+
+def iter_trajectory(n: int) -> Iterator[int]:
     assert n > 0, f"{n} <= 0. n must be a positive integer."
 
-    lst = []
     while n != 1:
         n = n // 2 if n % 2 == 0 else 3 * n + 1
-        lst.append(n)
+        yield n
+
+
+def get_length(n: int, k: int = JUMP_BITS) -> int:
+    # Same as `len(generate(n))`, without keeping the trajectory. While n is large, the lowest k bits determine the
+    # next k shortcut steps, so they are taken at once with 1 shift, 1 small multiplication and 1 addition.
+    assert n > 0, f"{n} <= 0. n must be a positive integer."
+    sieve = get_sieve(k)
+    mask, far = (1 << k) - 1, 1 << (k + 1)  # Above `far`, k shortcut steps cannot reach 1
+    pow3 = [3 ** a for a in range(k + 1)]
+    length = 0
+    while n >= far:
+        a = sieve.odd_steps[n & mask]
+        n, length = pow3[a] * (n >> k) + sieve.jumps[n & mask], length + k + a
+    return length + _get_tail_length(n)
+
+
+def _get_tail_length(n: int) -> int:
+    # Strip all trailing zero bits at once, then fuse each 3n + 1 with the halvings that follow it
+    z = (n & -n).bit_length() - 1
+    n, length = n >> z, z
+    while n != 1:
+        n = 3 * n + 1
+        z = (n & -n).bit_length() - 1
+        n, length = n >> z, length + 1 + z
+    return length
+
+
+def get_peak(n: int) -> int:
+    # Highest value of the trajectory, n itself included. It is always reached right after a 3n + 1 step (or is n
+    # itself), so the halvings in between are fused as in `get_length`.
+    assert n > 0, f"{n} <= 0. n must be a positive integer."
+    peak = n
+    n >>= (n & -n).bit_length() - 1
+    while n != 1:
+        n = 3 * n + 1
+        if n > peak:
+            peak = n
+        n >>= (n & -n).bit_length() - 1
+    return peak
+
+
+def _walk(n: int, times: Sequence[int], beyond: dict[int, int], cache_size: int, backfill: bool = True) -> tuple[int, int]:
+    # Walk until the trajectory reaches 1 or a cached value, then backfill the stopping times of the walked values.
+    # times[v] caches every v < len(times) (0 means unknown, except for 1); values beyond go to `beyond`, which is
+    # emptied whenever it reaches `cache_size` entries. Also return the highest value walked, n included.
+    path = []
+    v, peak, size = n, n, len(times)
+    while v != 1 and not (v < size and times[v]) and v not in beyond:
+        path.append(v)
+        if v & 1:
+            v = 3 * v + 1
+            if v > peak:
+                peak = v
+        else:
+            v >>= 1
+
+    t = 0 if v == 1 else times[v] if v < size else beyond[v]
+    if not backfill:
+        return t + len(path), peak
+    for u in reversed(path):
+        t += 1
+        if u < size:
+            times[u] = t
+        else:
+            if len(beyond) >= cache_size:
+                beyond.clear()
+            beyond[u] = t
+    return t, peak
+
+
+def stopping_times(
+    start: int,
+    stop: int,
+    cache_size: int = CACHE_SIZE,
+    cache: Optional["StoppingTimeCache"] = None,
+) -> RangeStats:
+    assert 0 < start < stop, f"Invalid range [{start}, {stop}). start must be positive and less than stop."
+
+    # A persistent cache is extended to the range if writable, and otherwise completed on the fly. Its values were
+    # not walked by this scan, so the peak of the range is unknown.
+    if cache is not None:
+        if not cache.readonly and len(cache) < stop:
+            cache.extend(stop)
+        times = array("I", (cache[n] for n in range(start, stop)))
+        max_time = max(times)
+        return RangeStats(times, start + times.index(max_time), max_time, None, None)
+
+    # Every value of the rest of a trajectory has been walked by a smaller n already, so the running maximum of
+    # walked values is the peak of the range. The table caches the small values every trajectory ends with, and is
+    # sized by the range rather than by `stop`, so that a short range of huge values goes through `beyond` instead.
+    size = min(stop, max(stop - start, TABLE_SIZE))
+    table = array("I", [0]) * size
+    times = array("I")  # Walking n backfills table[n], so only the values past the table are kept here
+    beyond: dict[int, int] = {}
+    argmax, max_time, argpeak, peak = start, -1, start, 0
+    for n in range(start, stop):
+        t, p = _walk(n, table, beyond, cache_size)
+        if n >= size:
+            times.append(t)
+        if t > max_time:
+            argmax, max_time = n, t
+        if p > peak:
+            argpeak, peak = n, p
+
+    return RangeStats(table[start:size] + times, argmax, max_time, argpeak, peak)
+
+
+class StoppingTimeCache(object):
+    # File layout: a header (magic, version, item size, number of entries) padded to CACHE_HEADER_SIZE bytes, then
+    # a flat little-endian uint32 array whose entry n is the stopping time of n (0 if unknown, except for 1)
+    _HEADER = struct.Struct("<8sIIQ")
+    _MAGIC = b"COLLATZ\0"
+    _VERSION = 1
+
+    def __init__(self, path: str, readonly: bool = False, cache_size: int = CACHE_SIZE) -> None:
+        self._path = path
+        self._readonly = readonly
+        self._cache_size = cache_size
+        self._beyond: dict[int, int] = {}
+        assert sys.byteorder == "little", "The cache stores its entries in little-endian order."
+        if readonly:
+            self._file = open(path, "rb")
+        else:  # 1 writer at a time; readers never lock, since entries only ever go from 0 to their final value
+            if not os.path.exists(path):
+                # Written under a temporary name, then linked into place only if the path is still free, so that
+                # nobody ever sees the file without its header, and racing writers never truncate each other's
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(self._HEADER.pack(self._MAGIC, self._VERSION, 4, 2).ljust(CACHE_HEADER_SIZE, b"\0"))
+                    f.write(bytes(8))
+                try:
+                    os.link(tmp, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp)
+            self._file = open(path, "r+b")
+            try:
+                import fcntl
+            except ImportError:  # No advisory file locks outside POSIX: the single writer is left to the caller
+                pass
+            else:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._file.seek(0)
+        magic, version, itemsize, size = self._HEADER.unpack(self._file.read(self._HEADER.size))
+        assert magic == self._MAGIC, f"{path} is not a stopping time cache."
+        assert version == self._VERSION and itemsize == 4, f"{path} has unsupported version {version}."
+        self._map(size)
+
+    def __enter__(self) -> "StoppingTimeCache":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"StoppingTimeCache({self._path!r}, readonly={self.readonly}, size={len(self)})"
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def __getitem__(self, n: int) -> int:
+        assert n > 0, f"{n} <= 0. n must be a positive integer."
+        if n < len(self._times) and (n == 1 or self._times[n]):
+            return self._times[n]
+        return _walk(n, self._times, self._beyond, self._cache_size, backfill=not self.readonly)[0]
+
+    def _map(self, size: int) -> None:
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self._mmap = mmap.mmap(self._file.fileno(), CACHE_HEADER_SIZE + 4 * size, access=access)
+        self._times = memoryview(self._mmap)[CACHE_HEADER_SIZE:].cast("I")
+
+    def _unmap(self) -> None:
+        self._times.release()
+        self._mmap.close()
 
-    return lst
+    def close(self) -> None:
+        if not self._file.closed:
+            self._unmap()
+            self._file.close()
+
+    def extend(self, stop: int) -> None:
+        # Grow the array to cover every n < stop, then fill it in increasing order
+        assert not self.readonly, f"{self._path} is opened read-only."
+        size = len(self)
+        if stop <= size:
+            return
+        self._unmap()
+        self._file.truncate(CACHE_HEADER_SIZE + 4 * stop)
+        self._map(stop)
+        self._beyond.clear()  # Some of its values now belong to the array
+        for n in range(max(size, 2), stop):
+            if not self._times[n]:
+                _walk(n, self._times, self._beyond, self._cache_size)
+        self._mmap[: self._HEADER.size] = self._HEADER.pack(self._MAGIC, self._VERSION, 4, stop)
+        self._mmap.flush()
+
+    @property
+    def readonly(self) -> bool:
+        return self._readonly
+
+
+def batch_stopping_times(values: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    array = np.asarray(values)
+    if array.dtype.kind not in "iu":  # Integers beyond int64 make NumPy fall back to floats or objects
+        array = np.asarray(values, dtype=object)
+    values = array
+    assert values.size == 0 or values.min() > 0, "All values must be positive integers."
+
+    # Values that do not fit in uint64 are walked exactly with Python ints from the start
+    times = np.zeros(values.shape, dtype=np.int64)
+    big = (values >= 2 ** 64).reshape(-1)
+    for lane in np.flatnonzero(big):
+        times.flat[lane] = get_length(int(values.flat[lane]))
+
+    # Advance every unfinished lane in lock-step, with the (3v + 1) / 2 shortcut counting as 2 steps
+    lanes = np.flatnonzero((values.reshape(-1) != 1) & ~big)
+    v = values.reshape(-1)[lanes].astype(np.uint64)
+    steps = np.zeros(lanes.size, dtype=np.int64)
+    limit = np.uint64((2 ** 64 - 2) // 3)  # 3v + 1 no longer fits in uint64 above this
+    one = np.uint64(1)
+    while lanes.size:
+        odd = (v & one).astype(bool)
+        overflow = odd & (v > limit)
+        if overflow.any():  # Finish these lanes exactly with Python ints
+            for lane, value, step in zip(lanes[overflow], v[overflow], steps[overflow]):
+                times.flat[lane] = step + get_length(int(value))
+            keep = ~overflow
+            lanes, v, steps, odd = lanes[keep], v[keep], steps[keep], odd[keep]
+        v = np.where(odd, (v * np.uint64(3) + one) >> one, v >> one)
+        steps += 1 + odd
+        done = v == one
+        if done.any():  # Drop finished lanes, so that later iterations only touch the active ones
+            times.flat[lanes[done]] = steps[done]
+            keep = ~done
+            lanes, v, steps = lanes[keep], v[keep], steps[keep]
+
+    return times
+
+
+class Sieve(NamedTuple):
+    k: int
+    odd_steps: array  # Number of odd steps among the first k shortcut steps of each residue r mod 2^k
+    jumps: array  # T^k(r), so that T^k(q * 2^k + r) = 3^odd_steps[r] * q + T^k(r)
+    thresholds: array  # Smallest q from which `glides[r]` (sieved) or the first k-step jump (survivor) is exact
+    glides: array  # Stopping time of sieved residues, 0 for the survivors
+    survivors: array
+
+
+@lru_cache(maxsize=4)
+def get_sieve(k: int = SIEVE_BITS) -> Sieve:
+    assert 1 <= k <= 32, f"k = {k}. k must be between 1 and 32."
+
+    # After j shortcut steps, n = q * 2^k + r becomes 3^a * 2^(k - j) * q + T^j(r), which is below n if and only
+    # if c * q + T^j(r) - r < 0 with c = 3^a * 2^(k - j) - 2^k. Once c < 0, every large enough q has dropped.
+    odd_steps, jumps = array("B", [0]) * (1 << k), array("Q", [0]) * (1 << k)
+    thresholds, glides = array("Q", [0]) * (1 << k), array("H", [0]) * (1 << k)
+    for r in range(1 << k):
+        t, a = r, 0
+        for j in range(1, k + 1):
+            if t & 1:
+                t, a = (3 * t + 1) >> 1, a + 1
+            else:
+                t >>= 1
+            if glides[r]:
+                continue
+            c = (3 ** a << (k - j)) - (1 << k)
+            if c < 0:  # Drops at step j once q > (t - r) / -c
+                thresholds[r] = max(thresholds[r], (t - r) // -c + 1 if t >= r else 0)
+                glides[r] = j + a
+            elif t < r:  # Stays above n at step j once q >= (r - t) / c
+                thresholds[r] = max(thresholds[r], -((t - r) // c))
+        odd_steps[r], jumps[r] = a, t
+    survivors = array("I", (r for r in range(1 << k) if not glides[r]))
+    return Sieve(k, odd_steps, jumps, thresholds, glides, survivors)
+
+
+def get_glide(n: int, sieve: Optional[Sieve] = None) -> int:
+    # Stopping time in the strict sense: number of steps until the trajectory first drops below n
+    assert n > 0, f"{n} <= 0. n must be a positive integer."
+    if n == 1:
+        return 0
+    sieve = get_sieve() if sieve is None else sieve
+    k, mask = sieve.k, (1 << sieve.k) - 1
+
+    q, r = n >> k, n & mask
+    v, steps = n, 0
+    if q >= sieve.thresholds[r]:
+        if sieve.glides[r]:
+            return sieve.glides[r]
+        v, steps = 3 ** sieve.odd_steps[r] * q + sieve.jumps[r], k + sieve.odd_steps[r]
+    far = (n + 1) << k  # From here, k shortcut steps cannot drop below n, so they are taken at once
+    while v >= n:
+        if v >= far:
+            r = v & mask
+            v, steps = 3 ** sieve.odd_steps[r] * (v >> k) + sieve.jumps[r], steps + k + sieve.odd_steps[r]
+        elif v & 1:
+            v, steps = (3 * v + 1) >> 1, steps + 2
+        else:
+            v, steps = v >> 1, steps + 1
+    return steps
+
+
+def search_chunk(start: int, stop: int, k: int = SIEVE_BITS) -> dict:
+    # Glide records within [start, stop): every n whose glide exceeds those of all smaller n in the chunk
+    sieve = get_sieve(k)
+    max_glide, max_threshold = max(sieve.glides), max(sieve.thresholds)
+    records, best, checked = [], 0, 0
+    n = start
+    while n < stop and (best <= max_glide or n >> k < max_threshold):
+        if (glide := get_glide(n, sieve)) > best:
+            records.append((n, glide))
+            best = glide
+        checked += 1
+        n += 1
+
+    # Sieved residues can no longer set a record, so only the survivors are visited
+    for q in range(n >> k, ((stop - 1) >> k) + 1):
+        base = q << k
+        for r in sieve.survivors:
+            if not n <= base + r < stop:
+                continue
+            if (glide := get_glide(base + r, sieve)) > best:
+                records.append((base + r, glide))
+                best = glide
+            checked += 1
+    return {"start": start, "stop": stop, "checked": checked, "records": records}
+
+
+def search(
+    start: int,
+    stop: int,
+    k: int = SIEVE_BITS,
+    chunk_size: int = SEARCH_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    checkpoint: Optional[str] = None,
+) -> dict:
+    assert 0 < start < stop, f"Invalid range [{start}, {stop}). start must be positive and less than stop."
+
+    # The checkpoint is a JSON lines log: the parameters of the search, then 1 line per finished chunk, so that
+    # saving a chunk costs the same however many came before. Resume from it, if any, which must describe the same
+    # search; a last line cut short by an interruption is dropped.
+    params = {"start": start, "stop": stop, "k": k, "chunk_size": chunk_size}
+    chunks = {}
+    log = None
+    if checkpoint is not None:
+        log = open(checkpoint, "a+b")
+        log.seek(0)
+        data = log.read()
+        end = data.rfind(b"\n") + 1
+        log.truncate(end)
+        lines = data[:end].splitlines()
+        if lines:
+            state = json.loads(lines[0])
+            assert state == params, f"{checkpoint} belongs to another search: {state}."
+            for line in lines[1:]:
+                chunk = json.loads(line)
+                chunks[chunk.pop("chunk")] = chunk
+        else:
+            log.write(json.dumps(params).encode() + b"\n")
+
+    # Small chunks are handed out as workers become free, so that slow chunks do not hold up the others
+    bounds = [(i, lo, min(lo + chunk_size, stop)) for i, lo in enumerate(range(start, stop, chunk_size))]
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            get_sieve(k)  # Fail early on invalid k
+            futures = {executor.submit(search_chunk, lo, hi, k): i for i, lo, hi in bounds if i not in chunks}
+            for future in as_completed(futures):
+                chunks[futures[future]] = future.result()
+                if log is not None:
+                    log.write(json.dumps({"chunk": futures[future], **chunks[futures[future]]}).encode() + b"\n")
+                    log.flush()
+    finally:
+        if log is not None:
+            log.close()
+
+    # Merge in range order, so that the result does not depend on which worker finished first
+    records, best = [], 0
+    for i in sorted(chunks):
+        for n, glide in chunks[i]["records"]:
+            if glide > best:
+                records.append((n, glide))
+                best = glide
+    checked = sum(chunk["checked"] for chunk in chunks.values())
+    return {"records": records, "checked": checked, "sieved": stop - start - checked, "chunks": len(chunks)}
+
+
+def write_trajectory(file: TextIO, n: int, chunk_size: int = CHUNK_SIZE) -> None:
+    # Same output as `print(*generate(n), sep=", ", file=file)`, converted and written `chunk_size` values at a time
+    values = iter_trajectory(n)
+    sep = ""
+    while chunk := list(islice(values, chunk_size)):
+        file.write(sep + ", ".join(map(str, chunk)))
+        sep = ", "
+    file.write("\n")
+
+
+def main_search(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(prog="collatz_conjecture.py search")
+    parser.add_argument(
+        "start", type=int,
+        help="First positive integer of the range.",
+    )
+    parser.add_argument(
+        "stop", type=int,
+        help="End of the range (exclusive).",
+    )
+    parser.add_argument(
+        "-k", "--sieve_bits", type=int, default=SIEVE_BITS,
+        help=f"Size of the residue sieve as a power of 2. Defaults to {SIEVE_BITS}.",
+    )
+    parser.add_argument(
+        "-c", "--chunk_size", type=int, default=SEARCH_CHUNK_SIZE,
+        help=f"Integers per chunk of work. Defaults to {SEARCH_CHUNK_SIZE}.",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "-cp", "--checkpoint", type=str, default=None,
+        help="JSON file recording finished chunks, from which a killed search resumes. Defaults to None.",
+    )
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    result = search(args.start, args.stop, args.sieve_bits, args.chunk_size, args.workers, args.checkpoint)
+    for n, glide in result["records"]:
+        print(f"{n}: {glide}")
+    print(
+        f"Checked {result['checked']} and sieved {result['sieved']} integers in {result['chunks']} chunks "
+        f"({time.perf_counter() - start:.2f} s).",
+        file=sys.stderr,
+    )
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["search"]:
+        main_search(sys.argv[2:])
+        sys.exit()
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "n", type=int,
         help="Positive integer",
     )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "-l", "--length_only", action="store_true",
+        help="Print the number of steps only.",
+    )
+    group.add_argument(
+        "-p", "--peak_only", action="store_true",
+        help="Print the highest value reached only.",
+    )
+    sys.set_int_max_str_digits(0)  # Allow inputs and values with thousands of digits
     args = parser.parse_args()
 
-    print(*generate(args.n), sep=", ")
+    if args.length_only:
+        print(get_length(args.n))
+    elif args.peak_only:
+        print(get_peak(args.n))
+    else:
+        write_trajectory(sys.stdout, args.n)
@@ -12,15 +12,92 @@ getch
 
 ```bash
 python guess_the_number.py [-min MIN_VALUE] [-max MAX_VALUE] [-s SEED]
+python guess_the_number.py -g GAMES [-min MIN_VALUE] [-max MAX_VALUE] [-s SEED] [-st STRATEGY] [-a ANSWERS] [-w WORKERS]
 ```
+
+With `-g`, no one plays: `GAMES` games are simulated headlessly with the
+given guessing strategy (bisection or random) against random or adversarial
+answers, and the distribution of attempts is printed.
+
+```bash
+python guess_the_number.py -sv [-min MIN_VALUE] [-max MAX_VALUE] [-s SEED] [-a ANSWERS] [-H HOST] [-p PORT]
+python guess_the_number.py -lt SESSIONS [-c CONCURRENCY] [-H HOST] [-p PORT]
+```
+
+With `-sv`, the game is served over TCP, 1 game per connection, with a
+line-based protocol: the server greets with `RANGE <min> <max>`, then
+answers each guess line with `LOW <min> <max>` (the answer is greater),
+`HIGH <min> <max>` (the answer is smaller), `OUT <min> <max>` (ignored),
+`ERROR <min> <max>` (not an integer) or `BINGO <answer> <attempts>`, after
+which it closes the connection. With `-lt`, a load generator plays
+`SESSIONS` games by bisection against such a server, `CONCURRENCY` at a
+time, and reports sessions/s and per-guess latency percentiles.
 """
 
 import argparse
+import asyncio
 import random
+import resource
 import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Union
 
 import getch
 
+CHUNK_SIZE = 1 << 14
+HOST = "127.0.0.1"
+PORT = 8765
+BACKLOG = 4096
+
+
+class Session(object):
+    # State of 1 game. `min_value` and `max_value` are the bounds shown to the player, as in the original game,
+    # while `lo` and `hi` bound the candidates left. Without `answer`, answers are adversarial: every reply keeps
+    # the larger half of the candidates, and the guess is only right once it is the last candidate.
+    __slots__ = ("min_value", "max_value", "lo", "hi", "answer", "attempts")
+
+    def __init__(self, min_value: int, max_value: int, answer: Optional[int] = None) -> None:
+        self.min_value, self.max_value = min_value, max_value
+        self.lo, self.hi = min_value, max_value
+        self.answer = answer
+        self.attempts = 1
+
+    def guess(self, guess: int) -> Optional[int]:
+        # -1 if the answer is greater, 1 if it is smaller, 0 if correct, None if out of bounds (ignored)
+        if not self.min_value <= guess <= self.max_value:
+            return None
+        if self.answer is not None:
+            result = (guess > self.answer) - (guess < self.answer)
+        elif self.lo == self.hi == guess:
+            result, self.answer = 0, guess
+        else:
+            result = -1 if guess < self.lo or (guess <= self.hi and self.hi - guess >= guess - self.lo) else 1
+        if result == 0:
+            return result
+        self.attempts += 1
+        if result < 0:
+            self.min_value, self.lo = guess, max(self.lo, guess + 1)
+        else:
+            self.max_value, self.hi = guess, min(self.hi, guess - 1)
+        return result
+
+
+Strategy = Callable[[Session, random.Random], int]
+
+
+def bisection(session: Session, rng: random.Random) -> int:
+    return (session.lo + session.hi) // 2
+
+
+def random_in_range(session: Session, rng: random.Random) -> int:
+    return rng.randint(session.lo, session.hi)
+
+
+STRATEGIES: dict[str, Strategy] = {"bisection": bisection, "random": random_in_range}
+ANSWERS = ("random", "adversarial")
+
 
 def get_number(prompt: str = "") -> int:
     print(prompt, end="", flush=True)
@@ -44,19 +121,161 @@ def get_number(prompt: str = "") -> int:
             return int("".join(num))
 
 
+def play(session: Session, strategy: Strategy, rng: random.Random) -> int:
+    while session.guess(strategy(session, rng)) != 0:
+        continue
+    return session.attempts
+
+
+def _simulate_chunk(
+    min_value: int,
+    max_value: int,
+    strategy: str,
+    answers: str,
+    games: int,
+    seed: str,
+) -> Counter:
+    rng = random.Random(seed)
+    guesser = STRATEGIES[strategy]
+    adversarial = answers == "adversarial"
+    attempts = Counter()
+    for _ in range(games):
+        session = Session(min_value, max_value, None if adversarial else rng.randint(min_value, max_value))
+        attempts[play(session, guesser, rng)] += 1
+    return attempts
+
+
+def simulate(
+    min_value: int = 1,
+    max_value: int = 100,
+    strategy: str = "bisection",
+    answers: str = "random",
+    games: int = 1000,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Counter:
+    # Check arguments
+    if min_value > max_value:
+        raise ValueError(f"`min_value` must not be greater than `max_value`, got {min_value} > {max_value}.")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"`strategy` must be one of {tuple(STRATEGIES)}, got {strategy!r}.")
+    if answers not in ANSWERS:
+        raise ValueError(f"`answers` must be one of {ANSWERS}, got {answers!r}.")
+    if games < 1:
+        raise ValueError(f"`games` must be greater than or equal to 1, got {games}.")
+
+    # Every chunk has its own generator seeded from (seed, chunk index), so that the distribution only depends on
+    # `seed`, whatever the number of workers
+    seed = random.randrange(1 << 64) if seed is None else seed
+    sizes = [CHUNK_SIZE] * (games // CHUNK_SIZE) + ([games % CHUNK_SIZE] if games % CHUNK_SIZE else [])
+    args = [(min_value, max_value, strategy, answers, size, f"{seed}:{i}") for i, size in enumerate(sizes)]
+    attempts = Counter()
+    if workers == 1:
+        for arg in args:
+            attempts.update(_simulate_chunk(*arg))
+        return attempts
+    with ProcessPoolExecutor(workers) as executor:
+        for result in executor.map(_simulate_chunk, *zip(*args)):
+            attempts.update(result)
+    return attempts
+
+
+async def serve(
+    host: str = HOST,
+    port: int = PORT,
+    min_value: int = 1,
+    max_value: int = 100,
+    answers: str = "random",
+    seed: Optional[int] = None,
+) -> None:
+    # 1 coroutine and 1 Session per connection, all on the event loop's thread
+    rng = random.Random(seed)
+    adversarial = answers == "adversarial"
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = Session(min_value, max_value, None if adversarial else rng.randint(min_value, max_value))
+        writer.write(f"RANGE {session.min_value} {session.max_value}\n".encode())
+        try:
+            while line := await reader.readline():
+                try:
+                    guess = int(line)
+                except ValueError:
+                    reply = "ERROR"
+                else:
+                    result = session.guess(guess)
+                    if result == 0:
+                        writer.write(f"BINGO {session.answer} {session.attempts}\n".encode())
+                        break
+                    reply = "OUT" if result is None else "LOW" if result < 0 else "HIGH"
+                writer.write(f"{reply} {session.min_value} {session.max_value}\n".encode())
+                await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port, backlog=BACKLOG)
+    print(f"Serving on {host}:{port}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(
+    sessions: int,
+    concurrency: int = 10000,
+    host: str = HOST,
+    port: int = PORT,
+) -> dict[str, Union[int, float]]:
+    # Play `sessions` games by bisection, `concurrency` connections at a time, timing every guess round trip
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play_remote() -> None:
+        async with semaphore:
+            reader, writer = await asyncio.open_connection(host, port)
+            _, lo, hi = (await reader.readline()).split()
+            lo, hi = int(lo), int(hi)
+            while True:
+                guess = (lo + hi) // 2
+                start = time.perf_counter()
+                writer.write(b"%d\n" % guess)
+                reply = (await reader.readline()).split()
+                latencies.append(time.perf_counter() - start)
+                if reply[0] == b"BINGO":
+                    break
+                elif reply[0] == b"LOW":
+                    lo = guess + 1
+                else:
+                    hi = guess - 1
+            writer.close()
+            await writer.wait_closed()
+
+    # Every connection needs a file descriptor, so allow as many as the hard limit does
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    start = time.perf_counter()
+    await asyncio.gather(*(play_remote() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    latencies.sort()
+    stats = {"sessions/s": sessions / elapsed, "guesses": len(latencies)}
+    for p in (50, 90, 99, 99.9):
+        stats[f"p{p} (ms)"] = latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+    stats["max (ms)"] = latencies[-1] * 1000
+    return stats
+
+
 def main(min_value: int = 1, max_value: int = 100) -> None:
-    answer = random.randint(min_value, max_value)
-    attempts = 1
+    session = Session(min_value, max_value, random.randint(min_value, max_value))
     bound_len = max(len(str(min_value)), len(str(max_value)))
-    while (guess := get_number(f"{min_value:{bound_len}d} <= x <= {max_value:{bound_len}d}: ")) != answer:
-        if not min_value <= guess <= max_value:
-            continue
-        attempts += 1
-        if guess < answer:
-            min_value = guess
-        elif guess > answer:
-            max_value = guess
-    print(f"BINGO! The answer is {answer}. You took {attempts} attempts.")
+
+    def prompt_number(session: Session, rng: random.Random) -> int:
+        return get_number(f"{session.min_value:{bound_len}d} <= x <= {session.max_value:{bound_len}d}: ")
+
+    attempts = play(session, prompt_number, random.Random())
+    print(f"BINGO! The answer is {session.answer}. You took {attempts} attempts.")
 
 
 if __name__ == "__main__":
@@ -73,7 +292,57 @@ if __name__ == "__main__":
         "-s", "--seed", type=int, default=None,
         help="Seed for random number generator. Defaults to None.",
     )
+    parser.add_argument(
+        "-g", "--games", type=int, default=None,
+        help="Simulate this many games headlessly instead of playing. Defaults to None.",
+    )
+    parser.add_argument(
+        "-st", "--strategy", type=str, default="bisection", choices=tuple(STRATEGIES),
+        help="Guessing strategy of simulated games. Defaults to bisection.",
+    )
+    parser.add_argument(
+        "-a", "--answers", type=str, default="random", choices=ANSWERS,
+        help="How simulated games answer: a random answer, or adversarial replies. Defaults to random.",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of worker processes of simulated games. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "-sv", "--serve", action="store_true",
+        help="Serve games over TCP instead of playing.",
+    )
+    parser.add_argument(
+        "-lt", "--load_test", type=int, default=None,
+        help="Play this many games against a server and report its performance. Defaults to None.",
+    )
+    parser.add_argument(
+        "-c", "--concurrency", type=int, default=10000,
+        help="Maximum number of concurrent connections of the load test. Defaults to 10000.",
+    )
+    parser.add_argument(
+        "-H", "--host", type=str, default=HOST,
+        help=f"Host of the server. Defaults to {HOST}.",
+    )
+    parser.add_argument(
+        "-p", "--port", type=int, default=PORT,
+        help=f"Port of the server. Defaults to {PORT}.",
+    )
     args = parser.parse_args()
 
-    random.seed(args.seed)
-    main(args.min_value, args.max_value)
+    if args.serve:
+        asyncio.run(serve(args.host, args.port, args.min_value, args.max_value, args.answers, args.seed))
+    elif args.load_test is not None:
+        stats = asyncio.run(load_test(args.load_test, args.concurrency, args.host, args.port))
+        print(*(f"{k}: {v:,.3f}" if isinstance(v, float) else f"{k}: {v:,}" for k, v in stats.items()), sep="\n")
+    elif args.games is None:
+        random.seed(args.seed)
+        main(args.min_value, args.max_value)
+    else:
+        attempts = simulate(
+            args.min_value, args.max_value, args.strategy, args.answers, args.games, args.seed, args.workers
+        )
+        mean = sum(k * v for k, v in attempts.items()) / args.games
+        print(f"{args.games} games in [{args.min_value}, {args.max_value}]: mean {mean:.3f} attempts")
+        for k in sorted(attempts):
+            print(f"{k:4d} attempts: {attempts[k]:10d} ({attempts[k] / args.games:7.3%})")
@@ -2,10 +2,29 @@
 # File: password_generator.py
 
 import argparse
-import random
+import os
+import secrets
 import string
+import struct
+import sys
+import time
 import warnings
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import combinations, repeat
+from math import ceil, factorial, log, log2, prod
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+SYMBOLS = string.punctuation
+WORD_BITS = 32
+CHUNK_CHARS = 1 << 20
+BUFFER_SIZE = 1 << 22
+EXACT_LIMIT = 1 << 20
+BITMAP_LIMIT = 1 << 30  # Bits, i.e. 128 MiB
+BLOOM_MAX_FRACTION = 0.5  # Largest share of the keyspace the Bloom filter may be asked to fill
+FP_RATE = 1e-6
 
 
 def generate_password(
@@ -23,44 +42,344 @@ def generate_password(
         return ""
     if exclusion is not None and not isinstance(exclusion, set):
         warnings.warn(f"`exclusion` is expected to be of type set, got {type(exclusion).__name__}.")
-    elif exclusion is None:
-        exclusion = set()
-
-    # Construct a list of included groups of character
-    uppercase = list(string.ascii_uppercase)
-    lowercase = list(string.ascii_lowercase)
-    digits = list(string.digits)
-    symbols = list(r"~`!@#$%^&*()_-+={[}]|\\:;\"'<,>.?/")
-    included = []
-    if include_uppercase:
-        included.append(uppercase)
-    if include_lowercase:
-        included.append(lowercase)
-    if include_digits:
-        included.append(digits)
-    if include_symbols:
-        included.append(symbols)
-    if len(included) == 0:
-        raise ValueError("At least 1 group of character must be included, got 0.")
-
-    # Flatten the above list of lists into a single list
-    combined = [c for group in included for c in group]
-    if len(set(combined).difference(exclusion)) == 0:
-        raise ValueError("No usable character left after exclusion.")
-
-    # Generate password
-    pwd = []
-    minimum = min(len(included), n)
-    for group in random.sample(included, minimum):  # At least 1 character from each included group
-        while (c := random.choice(group)) in exclusion:
-            continue
-        pwd.append(c)
-    for _ in range(n - minimum):  # The remaining portion
-        while (c := random.choice(combined)) in exclusion:
-            continue
-        pwd.append(c)
-
-    return "".join(random.sample(pwd, len(pwd)))  # Shuffle again
+
+    exclusion = frozenset() if exclusion is None else frozenset(exclusion)
+    return _get_policy(include_uppercase, include_lowercase, include_digits, include_symbols, exclusion).generate(n)
+
+
+def _get_table(alphabet: str) -> tuple[bytes, bytes]:
+    # Byte b maps to alphabet[b % size]; bytes >= limit would favour the first characters, so they are dropped
+    limit = 256 - 256 % len(alphabet)
+    return (alphabet * (limit // len(alphabet))).encode("ascii").ljust(256, b"\0"), bytes(range(limit, 256))
+
+
+def _random_chars(k: int, table: bytes, rejected: bytes) -> str:
+    chunks, remaining = [], k
+    while remaining > 0:
+        # Over-draw by the expected rejection rate so that one round almost always suffices
+        raw = os.urandom(remaining * 256 // (256 - len(rejected)) + 64).translate(table, rejected)[:remaining]
+        chunks.append(raw)
+        remaining -= len(raw)
+    return b"".join(chunks).decode("ascii")
+
+
+def _get_limit(bound: int) -> int:
+    return (1 << WORD_BITS) - (1 << WORD_BITS) % bound
+
+
+def _random_below(bound: int, k: int) -> list[int]:
+    # Same rejection as `_random_chars`, on 32-bit words; a rejected word is simply redrawn
+    limit = _get_limit(bound)
+    words = memoryview(os.urandom(k * WORD_BITS // 8)).cast("I").tolist()
+    return [(w if w < limit else _redraw_below(limit)) % bound for w in words]
+
+
+def _redraw_below(limit: int) -> int:
+    while (w := secrets.randbits(WORD_BITS)) >= limit:
+        continue
+    return w
+
+
+class PasswordPolicy(object):
+    def __init__(
+        self,
+        include_uppercase: bool = True,
+        include_lowercase: bool = True,
+        include_digits: bool = True,
+        include_symbols: bool = True,
+        exclusion: Optional[set[str]] = None,
+    ) -> None:
+        exclusion = set() if exclusion is None else set(exclusion)
+        included = []
+        if include_uppercase:
+            included.append(string.ascii_uppercase)
+        if include_lowercase:
+            included.append(string.ascii_lowercase)
+        if include_digits:
+            included.append(string.digits)
+        if include_symbols:
+            included.append(SYMBOLS)
+        if len(included) == 0:
+            raise ValueError("At least 1 group of character must be included, got 0.")
+
+        # Filter the exclusion out once, so that generation never has to reject an excluded character
+        self._groups = tuple("".join(c for c in group if c not in exclusion) for group in included)
+        for group, filtered in zip(included, self._groups):
+            if len(filtered) == 0:
+                raise ValueError(f"No usable character left in group {group!r} after exclusion.")
+        self._alphabet = "".join(self._groups)
+        self._tables = tuple(map(_get_table, self._groups))
+        self._table = _get_table(self._alphabet)
+        self._limits = tuple(_get_limit(len(group)) for group in self._groups)
+        self._words = f"<{2 * len(self._groups)}I"
+
+    def __repr__(self) -> str:
+        return f"PasswordPolicy(groups={self.groups!r})"
+
+    def generate(self, n: int) -> str:
+        if n < len(self.groups):
+            return self.generate_many(1, n)[0]
+
+        # Same construction as `generate_many`, with all the entropy taken from 1 system call: the bytes for the
+        # remaining portion (over-drawn twice to absorb rejection), then 1 word per group character and per position
+        body_len = n - len(self.groups)
+        head = 2 * body_len + 16
+        raw = os.urandom(head + 2 * len(self.groups) * WORD_BITS // 8)
+        pwd = raw[:head].translate(*self._table)[:body_len].decode("ascii")
+        if len(pwd) < body_len:
+            return self.generate_many(1, n)[0]
+        words = struct.unpack_from(self._words, raw, head)
+        for group, limit, w, v, bound in zip(
+            self.groups, self._limits, words[::2], words[1::2], range(body_len + 1, n + 1)
+        ):
+            if w >= limit or v >= _get_limit(bound):
+                return self.generate_many(1, n)[0]
+            i = v % bound
+            pwd = pwd[:i] + group[w % len(group)] + pwd[i:]
+        return pwd
+
+    def generate_many(self, count: int, n: int) -> list[str]:
+        # Check arguments
+        if count < 0:
+            raise ValueError(f"`count` must be greater than or equal to 0, got {count}.")
+        if n < 0:
+            raise ValueError(f"`n` must be greater than or equal to 0, got {n}.")
+        if count == 0 or n == 0:
+            return [""] * count
+
+        # Draw all characters in bulk: the remaining portion from the combined alphabet, then 1 per included group
+        minimum = min(len(self.groups), n)
+        body_len = n - minimum
+        body = _random_chars(count * body_len, *self._table)
+        if minimum == len(self.groups):
+            picks = [_random_chars(count, *table) for table in self._tables]
+        else:  # Too short to hold every group: each password takes 1 character from `n` distinct random groups
+            rng = secrets.SystemRandom()
+            picks = [
+                "".join(t) for t in zip(*(map(rng.choice, rng.sample(self.groups, minimum)) for _ in range(count)))
+            ]
+
+        # Insert the group characters at uniformly random positions, which is equivalent to shuffling the password
+        pwds = [body[j * body_len : (j + 1) * body_len] for j in range(count)]
+        for pick, bound in zip(picks, range(body_len + 1, n + 1)):
+            pwds = [pwd[:i] + c + pwd[i:] for pwd, c, i in zip(pwds, pick, _random_below(bound, count))]
+
+        return pwds
+
+    def keyspace(self, n: int) -> int:
+        # Number of distinct passwords of length `n` that satisfy the group guarantee
+        if n < 0:
+            raise ValueError(f"`n` must be greater than or equal to 0, got {n}.")
+        sizes = [len(group) for group in self.groups]
+        if n < len(sizes):  # 1 character from each of `n` distinct groups, in any order
+            return factorial(n) * sum(prod(t) for t in combinations(sizes, n))
+        # Inclusion-exclusion over the subsets of groups that are missing
+        return sum(
+            (-1) ** k * sum((len(self.alphabet) - sum(t)) ** n for t in combinations(sizes, k))
+            for k in range(len(sizes) + 1)
+        )
+
+    @property
+    def alphabet(self) -> str:
+        return self._alphabet
+
+    @property
+    def groups(self) -> tuple[str, ...]:
+        return self._groups
+
+
+@lru_cache(maxsize=32)
+def _get_policy(*args) -> PasswordPolicy:
+    return PasswordPolicy(*args)
+
+
+def generate_passwords(
+    count: int,
+    n: int,
+    include_uppercase: bool = True,
+    include_lowercase: bool = True,
+    include_digits: bool = True,
+    include_symbols: bool = True,
+    exclusion: Optional[set[str]] = None,
+) -> list[str]:
+    policy = PasswordPolicy(include_uppercase, include_lowercase, include_digits, include_symbols, exclusion)
+    return policy.generate_many(count, n)
+
+
+class BloomFilter(object):
+    def __init__(self, capacity: int, fp_rate: float = FP_RATE) -> None:
+        # Check arguments
+        if capacity < 1:
+            raise ValueError(f"`capacity` must be greater than or equal to 1, got {capacity}.")
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"`fp_rate` must be between 0 and 1 (exclusive), got {fp_rate}.")
+
+        # Optimal number of bits and of hash functions for `capacity` items at `fp_rate`
+        self._size = max(8, ceil(-capacity * log(fp_rate) / log(2) ** 2))
+        self._n_hashes = max(1, round(self._size / capacity * log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def __repr__(self) -> str:
+        return f"BloomFilter(size={self.size}, n_hashes={self.n_hashes})"
+
+    def __contains__(self, item: bytes) -> bool:
+        bits = self._bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in self._get_indices(item))
+
+    def _get_indices(self, item: bytes) -> Iterator[int]:
+        # Double hashing: the i-th index is (h1 + i * h2) % size, with both halves taken from 1 digest and reduced
+        # first, so that the indices are stepped through with small integers
+        h = int.from_bytes(blake2b(item, digest_size=16).digest(), "little")
+        size = self._size
+        i, step = (h >> 64) % size, (h & 0xFFFFFFFFFFFFFFFF | 1) % size
+        for _ in range(self._n_hashes):
+            yield i
+            i += step
+            if i >= size:
+                i -= size
+
+    def add(self, item: bytes) -> bool:
+        # Test and set in 1 pass over the indices: whether `item` was new, i.e. any of its bits was still unset
+        bits, new = self._bits, False
+        for i in self._get_indices(item):
+            mask = 1 << (i & 7)
+            if not bits[i >> 3] & mask:
+                bits[i >> 3] |= mask
+                new = True
+        return new
+
+    @property
+    def n_hashes(self) -> int:
+        return self._n_hashes
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+class PasswordBitmap(object):
+    # 1 bit per string of length `n` over `alphabet`, indexed by the string read as a number in base len(alphabet).
+    # Exact, and its size only depends on the alphabet and `n`, however many passwords are added.
+    def __init__(self, alphabet: str, n: int) -> None:
+        self._base = len(alphabet)
+        self._ranks = bytes(alphabet.find(chr(b)) % 256 for b in range(256))
+        self._bits = bytearray((self._base ** n + 7) // 8)
+
+    def __repr__(self) -> str:
+        return f"PasswordBitmap(size={self.size})"
+
+    def __contains__(self, item: bytes) -> bool:
+        i = self._get_index(item)
+        return bool(self._bits[i >> 3] & (1 << (i & 7)))
+
+    def _get_index(self, item: bytes) -> int:
+        i, base = 0, self._base
+        for rank in item.translate(self._ranks):
+            i = i * base + rank
+        return i
+
+    def add(self, item: bytes) -> bool:
+        i = self._get_index(item)
+        byte, mask = i >> 3, 1 << (i & 7)
+        if self._bits[byte] & mask:
+            return False
+        self._bits[byte] |= mask
+        return True
+
+    @property
+    def size(self) -> int:
+        return 8 * len(self._bits)
+
+
+class _SeenSet(set):
+    # A set whose `add` also tells whether the item was new, like the filters above
+    def add(self, item: bytes) -> bool:
+        if item in self:
+            return False
+        super().add(item)
+        return True
+
+
+def _generate_chunk(policy: PasswordPolicy, count: int, n: int) -> bytes:
+    return "".join(pwd + "\n" for pwd in policy.generate_many(count, n)).encode("ascii")
+
+
+def _iter_chunks(policy: PasswordPolicy, n: int, sizes: Iterable[int], workers: int) -> Iterator[bytes]:
+    if workers == 1:
+        for size in sizes:
+            yield _generate_chunk(policy, size, n)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for size in sizes:
+            if len(pending) >= 2 * workers:  # Keep every worker busy while the oldest chunk is being consumed
+                yield pending.popleft().result()
+            pending.append(executor.submit(_generate_chunk, policy, size, n))
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_passwords(
+    file: BinaryIO,
+    policy: PasswordPolicy,
+    count: int,
+    n: int,
+    workers: int = 1,
+    chunk_chars: int = CHUNK_CHARS,
+    unique: bool = False,
+    fp_rate: float = FP_RATE,
+) -> int:
+    # Check arguments
+    if count < 0:
+        raise ValueError(f"`count` must be greater than or equal to 0, got {count}.")
+    if workers < 1:
+        raise ValueError(f"`workers` must be greater than or equal to 1, got {workers}.")
+    if chunk_chars < 1:
+        raise ValueError(f"`chunk_chars` must be greater than or equal to 1, got {chunk_chars}.")
+    if unique:
+        # Small outputs are deduplicated with a set, and small keyspaces with a bitmap, both exactly. Otherwise a
+        # Bloom filter is used: a false positive only discards a fresh password, so the output stays unique, but it
+        # also hides up to `fp_rate` of the unseen ones. Past `BLOOM_MAX_FRACTION` of the passwords the filter still
+        # accepts, the draws could run out, so such outputs are refused.
+        keyspace = policy.keyspace(n)
+        if count > keyspace:
+            raise ValueError(f"Cannot generate {count} unique passwords from a keyspace of {keyspace}.")
+        if count <= EXACT_LIMIT:
+            seen = _SeenSet()
+        elif len(policy.alphabet) ** n <= BITMAP_LIMIT:
+            seen = PasswordBitmap(policy.alphabet, n)
+        elif count <= keyspace * (1 - fp_rate) * BLOOM_MAX_FRACTION:
+            seen = BloomFilter(count, fp_rate)
+        else:
+            raise ValueError(
+                f"Cannot deduplicate {count} passwords from a keyspace of {keyspace}: above {EXACT_LIMIT} passwords "
+                f"and {BITMAP_LIMIT} candidate strings, at most {BLOOM_MAX_FRACTION:.0%} of the keyspace can be drawn."
+            )
+
+    # Write newline-separated passwords chunk by chunk, so that memory is bounded by the chunks in flight. Chunks
+    # hold about `chunk_chars` characters whatever the length of the passwords.
+    chunk_size = max(1, chunk_chars // (n + 1))
+    written = 0
+    if not unique:
+        sizes = [chunk_size] * (count // chunk_size) + ([count % chunk_size] if count % chunk_size else [])
+        for chunk in _iter_chunks(policy, n, sizes, workers):
+            written += file.write(chunk)
+        return written
+
+    # Keep drawing chunks until enough unseen passwords are found
+    remaining = count
+    chunks = _iter_chunks(policy, n, repeat(min(chunk_size, count)), workers)
+    while remaining > 0:
+        fresh = []
+        for pwd in next(chunks).split(b"\n")[:-1]:
+            if seen.add(pwd):
+                fresh.append(pwd + b"\n")
+                if len(fresh) == remaining:
+                    break
+        written += file.write(b"".join(fresh))
+        remaining -= len(fresh)
+    chunks.close()
+    return written
 
 
 if __name__ == "__main__":
@@ -71,13 +390,39 @@ if __name__ == "__main__":
     parser.add_argument("-nd", "--no_digits", action="store_true")
     parser.add_argument("-ns", "--no_symbols", action="store_true")
     parser.add_argument("-e", "--exclusion", type=str, default=None)
+    parser.add_argument("-c", "--count", type=int, default=1)
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("-o", "--output", type=str, default=None)
+    parser.add_argument("-u", "--unique", action="store_true")
+    parser.add_argument("-fp", "--fp_rate", type=float, default=FP_RATE)
     args = parser.parse_args()
-    pwd = generate_password(
-        args.n,
+    policy = PasswordPolicy(
         include_uppercase=not args.no_uppercase,
         include_lowercase=not args.no_lowercase,
         include_digits=not args.no_digits,
         include_symbols=not args.no_symbols,
         exclusion=set(args.exclusion) if args.exclusion is not None else None,
     )
-    print(pwd)
+    start = time.perf_counter()
+    if args.output is None:
+        written = write_passwords(
+            sys.stdout.buffer, policy, args.count, args.n,
+            workers=args.workers, unique=args.unique, fp_rate=args.fp_rate,
+        )
+        sys.stdout.flush()
+    else:
+        with open(args.output, "wb", buffering=BUFFER_SIZE) as f:
+            written = write_passwords(
+                f, policy, args.count, args.n,
+                workers=args.workers, unique=args.unique, fp_rate=args.fp_rate,
+            )
+    elapsed = time.perf_counter() - start
+    if args.count > 1:  # Report throughput on stderr, so that it never mixes with the passwords
+        print(
+            f"{args.count} passwords ({written / 1e6:.1f} MB) in {elapsed:.2f} s: "
+            f"{args.count / elapsed:,.0f} passwords/s, {written / 1e6 / elapsed:.1f} MB/s",
+            file=sys.stderr,
+        )
+    if args.unique:
+        keyspace = policy.keyspace(args.n)
+        print(f"Keyspace: {keyspace} (~2^{log2(keyspace):.1f}), {keyspace - args.count} remaining", file=sys.stderr)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# File: password_generator_benchmark.py
+
+"""
+Benchmark and statistical-quality checks for password_generator.py.
+
+Timings of single (`generate_password`) and batched (`generate_passwords`)
+generation are recorded in passwords per second, across lengths, groups of
+character and exclusion sizes. They can be saved as a JSON baseline and
+compared against it later. The chi-square checks compare character and
+per-position frequencies over millions of characters with the distribution
+implied by the group guarantee.
+
+### Usage:
+
+```bash
+python password_generator_benchmark.py [-b BASELINE] [-u] [-t TOLERANCE] [-s SAMPLES]
+```
+"""
+
+import argparse
+import json
+import platform
+import string
+import sys
+import time
+from collections import Counter
+from math import erfc, sqrt
+from timeit import Timer
+
+import password_generator
+
+LENGTHS = (8, 16, 64, 256, 1024, 4096)
+GROUPS = {
+    "ulds": (True, True, True, True),
+    "uld": (True, True, True, False),
+    "d": (False, False, True, False),
+}
+EXCLUSIONS = {
+    0: "",
+    8: "0O1lI|`'",
+    48: string.ascii_uppercase[:20] + string.ascii_lowercase[:20] + string.punctuation[:8],
+}
+BATCH_CHARS = 1 << 20  # Characters per timed batch, so that every length does a comparable amount of work
+ALPHA = 1e-3
+
+
+def _chi2_sf(x: float, df: int) -> float:
+    # Wilson-Hilferty: (x / df) ** (1 / 3) is approximately normal, which is accurate for the large df used here
+    z = ((x / df) ** (1 / 3) - (1 - 2 / (9 * df))) / sqrt(2 / (9 * df))
+    return erfc(z / sqrt(2)) / 2
+
+
+def _get_expected(policy: password_generator.PasswordPolicy, n: int) -> dict[str, float]:
+    # Probability of each character at any given position. With n >= number of groups, a position holds the
+    # guaranteed character of a given group with probability 1 / n and a character of the remaining portion
+    # otherwise; with fewer positions, every position holds a character of a uniformly random group.
+    g, a = len(policy.groups), len(policy.alphabet)
+    if n < g:
+        return {c: 1 / (g * len(group)) for group in policy.groups for c in group}
+    return {c: 1 / (n * len(group)) + (n - g) / (n * a) for group in policy.groups for c in group}
+
+
+def check_uniformity(n: int, samples: int, batched: bool = True, **kwargs) -> dict[str, float]:
+    policy = password_generator.PasswordPolicy(**kwargs)
+    expected = _get_expected(policy, n)
+    positions = [Counter() for _ in range(n)]
+    chunk_size = max(1, password_generator.CHUNK_CHARS // n)
+    for start in range(0, samples, chunk_size):
+        size = min(chunk_size, samples - start)
+        pwds = policy.generate_many(size, n) if batched else [policy.generate(n) for _ in range(size)]
+        for i, column in enumerate(zip(*pwds)):
+            positions[i].update(column)
+
+    # Character frequencies over all positions, then the position x character table
+    overall = sum(positions, Counter())
+    stat = sum((overall[c] - samples * n * p) ** 2 / (samples * n * p) for c, p in expected.items())
+    pos_stat = sum(
+        (counter[c] - samples * p) ** 2 / (samples * p) for counter in positions for c, p in expected.items()
+    )
+    return {
+        "characters": _chi2_sf(stat, len(expected) - 1),
+        "positions": _chi2_sf(pos_stat, n * (len(expected) - 1)),
+    }
+
+
+def run_benchmarks() -> dict[str, float]:
+    results = {}
+    for groups, flags in GROUPS.items():
+        include = dict(zip(("include_uppercase", "include_lowercase", "include_digits", "include_symbols"), flags))
+        for size, exclusion in EXCLUSIONS.items():
+            try:
+                password_generator.PasswordPolicy(**include, exclusion=set(exclusion))
+            except ValueError:  # The exclusion empties one of the groups
+                continue
+            kwargs = dict(include, exclusion=set(exclusion))
+            for n in LENGTHS:
+                key = f"groups={groups}/exclusion={size}/n={n}"
+                timer = Timer(lambda: password_generator.generate_password(n, **kwargs))
+                number, elapsed = timer.autorange()
+                results[f"single/{key}"] = number / elapsed
+                count = max(1, BATCH_CHARS // n)
+                timer = Timer(lambda: password_generator.generate_passwords(count, n, **kwargs))
+                number, elapsed = timer.autorange()
+                results[f"batch/{key}"] = number * count / elapsed
+                single, batch = results[f"single/{key}"], results[f"batch/{key}"]
+                print(f"{key:40s} single {single:>12,.0f}/s  batch {batch:>12,.0f}/s")
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    return [
+        f"{key}: {results[key]:,.0f}/s vs {rate:,.0f}/s ({results[key] / rate - 1:+.1%})"
+        for key, rate in baseline.items()
+        if key in results and results[key] < rate * (1 - tolerance)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b", "--baseline", type=str, default="password_generator_baseline.json",
+        help="JSON baseline to compare against. Defaults to password_generator_baseline.json.",
+    )
+    parser.add_argument(
+        "-u", "--update", action="store_true",
+        help="Write the results to the baseline instead of comparing against it.",
+    )
+    parser.add_argument(
+        "-t", "--tolerance", type=float, default=0.2,
+        help="Relative slowdown reported as a regression. Defaults to 0.2.",
+    )
+    parser.add_argument(
+        "-s", "--samples", type=int, default=250000,
+        help="Passwords per chi-square check (x length in characters). Defaults to 250000.",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for n, batched, kwargs in (
+        (3, True, {}),
+        (16, True, {}),
+        (16, False, {}),
+        (16, True, {"exclusion": set(EXCLUSIONS[8])}),
+        (64, True, {"include_symbols": False}),
+    ):
+        start = time.perf_counter()
+        p_values = check_uniformity(n, args.samples, batched, **kwargs)
+        ok = all(p >= ALPHA for p in p_values.values())
+        failed |= not ok
+        print(
+            f"chi-square n={n} {'batch' if batched else 'single'} {kwargs}: "
+            f"characters p={p_values['characters']:.4f}, "
+            f"positions p={p_values['positions']:.4f} [{'OK' if ok else 'BIASED'}] "
+            f"({time.perf_counter() - start:.1f} s)"
+        )
+
+    results = run_benchmarks()
+    if args.update:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "results": results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}.")
+    else:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}; run with --update to create it.")
+        else:
+            regressions = compare(results, baseline, args.tolerance)
+            failed |= len(regressions) > 0
+            print(*(f"REGRESSION {r}" for r in regressions), sep="\n")
+
+    sys.exit(1 if failed else 0)
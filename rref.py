@@ -1,14 +1,164 @@
 # -*- coding: utf-8 -*-
 # File: rref.py
 
-from copy import deepcopy
+import heapq
+import os
+import sys
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from fractions import Fraction
+from importlib.util import find_spec
+from itertools import count
+from math import gcd, isqrt, lcm
 from numbers import Real
+from typing import TYPE_CHECKING, Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence, Union
+
+if TYPE_CHECKING:  # For the annotations only: the NumPy backends import it lazily
+    import numpy as np
+
+BACKENDS = ("fraction", "bareiss", "float", "modular")
+TOLERANCE = 1e-9
+MAX_DENOMINATOR = 10 ** 6
+PRIME_BITS = 31  # Products of 2 residues fit in an int64
+INT_FORMATS = frozenset("bBhHiIlLqQnN")
+NATIVE_ORDERS = frozenset(("", "@", "=", "<") if sys.byteorder == "little" else ("", "@", "=", ">", "!"))
+
+
+def batch_rref(matrices: "np.ndarray", tol: float = TOLERANCE) -> "np.ndarray":
+    import numpy as np
+
+    # Gauss-Jordan elimination with partial pivoting of a stack of matrices at once: every matrix has its own rank
+    # so far, and a column only gets a pivot in the matrices where its largest candidate exceeds `tol`
+    matrices = np.array(matrices, dtype=np.float64)
+    assert matrices.ndim == 3, "`matrices` must be a stack of matrices."
+    n_batch, n_rows, n_cols = matrices.shape
+    lanes, rows = np.arange(n_batch), np.arange(n_rows)
+    rank = np.zeros(n_batch, dtype=np.intp)
+    for col in range(n_cols):
+        candidates = np.where(rows >= rank[:, None], np.abs(matrices[:, :, col]), -1.0)
+        pivot_row = candidates.argmax(axis=1)
+        found = (candidates[lanes, pivot_row] > tol) & (rank < n_rows)
+        if not found.any():
+            matrices[:, :, col][np.abs(matrices[:, :, col]) <= tol] = 0.0
+            continue
+        b, top, pivot_row = lanes[found], rank[found], pivot_row[found]
+        matrices[b, top], matrices[b, pivot_row] = matrices[b, pivot_row], matrices[b, top].copy()
+        matrices[b, top] /= matrices[b, top, col, None]
+        factors = matrices[b, :, col]
+        factors[np.arange(len(b)), top] = 0.0
+        matrices[b] -= factors[:, :, None] * matrices[b, top][:, None, :]
+        matrices[b, :, col] = 0.0
+        matrices[b, top, col] = 1.0
+        matrices[:, :, col][np.abs(matrices[:, :, col]) <= tol] = 0.0
+        rank += found
+    return matrices
+
+
+def _is_prime(n: int) -> bool:
+    # Deterministic Miller-Rabin with bases 2, 3, 5 and 7, which is exact below 3215031751
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7):
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for a in (2, 3, 5, 7):
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _iter_primes() -> Iterator[int]:
+    return (n for n in count((1 << PRIME_BITS) - 1, -2) if _is_prime(n))
+
+
+def _rref_mod(residues: list[int], n_cols: int, p: int) -> tuple[list[int], list[int]]:
+    import numpy as np
+
+    # Gauss-Jordan elimination over GF(p). Returns the pivot columns and the row-major entries of the nonzero rows of
+    # the RREF in the other columns, as the pivot columns only hold 0 and 1.
+    matrix = np.array(residues, dtype=np.int64).reshape(-1, n_cols)
+    pivots = []
+    for col in range(n_cols):
+        rank = len(pivots)
+        if rank == len(matrix):
+            break
+        candidates = np.flatnonzero(matrix[rank:, col])
+        if candidates.size == 0:
+            continue
+        pivot_row = rank + candidates[0]
+        if pivot_row != rank:
+            matrix[[rank, pivot_row]] = matrix[[pivot_row, rank]]
+        # Columns left of the pivot are already reduced
+        right = matrix[:, col:]
+        right[rank] = right[rank] * pow(int(right[rank, 0]), -1, p) % p
+        factors = right[:, 0].copy()
+        factors[rank] = 0
+        right -= np.outer(factors, right[rank])
+        right %= p
+        pivots.append(col)
+    free = [col for col in range(n_cols) if col not in set(pivots)]
+    return pivots, matrix[:len(pivots), free].ravel().tolist()
+
+
+def _reconstruct(u: int, modulus: int) -> Optional[Fraction]:
+    # Rational reconstruction: the a / b = u (mod modulus) with |a|, b <= sqrt(modulus / 2), if any, by the
+    # extended Euclidean algorithm stopped halfway
+    bound = isqrt(modulus // 2)
+    r0, r1, s0, s1 = modulus, u, 0, 1
+    while r1 > bound:
+        q = r0 // r1
+        r0, r1, s0, s1 = r1, r0 - q * r1, s1, s0 - q * s1
+    if s1 == 0 or abs(s1) > bound or gcd(r1, s1) != 1:
+        return None
+    return Fraction(r1, s1)
+
+
+def _reconstruct_all(residues: list[int], modulus: int) -> Optional[list[Fraction]]:
+    # Entries of an RREF mostly share their denominators, so that each entry is first tried as a small numerator
+    # over the common denominator so far, which only costs 1 product, before a full reconstruction
+    bound, den, values = isqrt(modulus // 2), 1, []
+    for x in residues:
+        num = x * den % modulus
+        if num > modulus // 2:
+            num -= modulus
+        if abs(num) <= bound:
+            values.append(Fraction(num, den))
+            continue
+        v = _reconstruct(x, modulus)
+        if v is None:
+            return None
+        den = lcm(den, v.denominator)
+        if den > bound:
+            return None
+        values.append(v)
+    return values
+
+
+def _to_fraction(value: Real) -> Fraction:
+    # Fractions are adopted as is and ints converted directly; other numbers go through their string, so that floats
+    # keep their shortest decimal representation (0.1 is 1/10)
+    if isinstance(value, Fraction):
+        return value
+    elif isinstance(value, int):
+        return Fraction(value)
+    return Fraction(str(value))
 
 
 class RowVector(object):
+    __slots__ = ("_vector",)
+
     def __init__(self, value: Real, *values: Real) -> None:
-        self._vector = [Fraction(str(v)) for v in (value, *values)]
+        self._vector = [_to_fraction(v) for v in (value, *values)]
 
     def __str__(self) -> str:
         return f"[{', '.join(self._get_str_fraction())}]"
@@ -19,30 +169,46 @@ class RowVector(object):
     def __len__(self) -> int:
         return len(self.vector)
 
+    def __iter__(self) -> Iterator[Fraction]:
+        return iter(self.vector)
+
     def __add__(self, other: "RowVector") -> "RowVector":
         assert len(self) == len(other)
-        return RowVector(*(self[i] + other[i] for i in range(len(self))))
+        return RowVector._from_fractions([a + b for a, b in zip(self, other)])
 
     def __sub__(self, other: "RowVector") -> "RowVector":
         assert len(self) == len(other)
-        return RowVector(*(self[i] - other[i] for i in range(len(self))))
+        return RowVector._from_fractions([a - b for a, b in zip(self, other)])
 
     def __mul__(self, multiplier: Real) -> "RowVector":
-        return RowVector(*(v * multiplier for v in self))
+        multiplier = _to_fraction(multiplier)
+        return RowVector._from_fractions([v * multiplier for v in self])
 
     def __truediv__(self, divisor: Real) -> "RowVector":
         assert divisor != 0
-        return RowVector(*(v / divisor for v in self))
+        divisor = _to_fraction(divisor)
+        return RowVector._from_fractions([v / divisor for v in self])
 
     def __getitem__(self, index: int) -> Fraction:
         return self.vector[index]
 
     def __setitem__(self, index: int, value: Real) -> None:
-        self._vector[index] = Fraction(str(value))
+        self._vector[index] = _to_fraction(value)
+
+    @classmethod
+    def _from_fractions(cls, values: list[Fraction]) -> "RowVector":
+        # Adopt `values` as is, without parsing them again
+        vector = cls.__new__(cls)
+        vector._vector = values
+        return vector
 
     def _get_str_fraction(self) -> tuple[str, ...]:
         return tuple(str(v) for v in self)
 
+    def _get_pairs(self) -> tuple[Iterable[int], Iterable[int]]:
+        # Numerators and denominators of the entries
+        return [v.numerator for v in self], [v.denominator for v in self]
+
     def get_first_nonzero_index(self) -> int:
         for i in range(len(self)):
             if self[i] != 0:
@@ -60,10 +226,157 @@ class RowVector(object):
         return self._vector
 
 
+class PackedRowVector(RowVector):
+    # Numerators and denominators are stored in 2 buffers of machine integers (any buffer of a C integer format,
+    # adopted without copying), and entries only become Fractions when read. Without denominators, the entries are
+    # integers. Entries must be reduced fractions with a positive denominator that fit the buffers.
+    __slots__ = ("_nums", "_dens")
+
+    def __init__(self, numerators: memoryview, denominators: Optional[memoryview] = None) -> None:
+        assert len(numerators) > 0 and (denominators is None or len(denominators) == len(numerators))
+        self._nums, self._dens = numerators, denominators
+
+    def __len__(self) -> int:
+        return len(self._nums)
+
+    def __iter__(self) -> Iterator[Fraction]:
+        if self._dens is None:
+            return map(Fraction, self._nums)
+        return map(Fraction, self._nums, self._dens)
+
+    def __getitem__(self, index: int) -> Fraction:
+        return Fraction(self._nums[index], 1 if self._dens is None else self._dens[index])
+
+    def __setitem__(self, index: int, value: Real) -> None:
+        value = _to_fraction(value)
+        assert self._dens is not None or value.denominator == 1
+        self._nums[index] = value.numerator
+        if self._dens is not None:
+            self._dens[index] = value.denominator
+
+    def _get_pairs(self) -> tuple[Iterable[int], Iterable[int]]:
+        return self._nums, [1] * len(self._nums) if self._dens is None else self._dens
+
+    @property
+    def vector(self) -> list[Fraction]:
+        return list(self)
+
+
+class SparseRowVector(object):
+    # Only the nonzero entries are stored, as (column, value) pairs sorted by column, so that the leading index is
+    # the first column and row operations are O(nnz) merges
+    __slots__ = ("_length", "_cols", "_values")
+
+    def __init__(self, length: int, items: Union[Mapping[int, Real], Iterable[tuple[int, Real]]] = ()) -> None:
+        items = items.items() if isinstance(items, Mapping) else items
+        pairs = sorted((c, _to_fraction(v)) for c, v in items if v != 0)
+        assert all(0 <= c < length for c, _ in pairs) and len({c for c, _ in pairs}) == len(pairs)
+        self._length = length
+        self._cols = [c for c, _ in pairs]
+        self._values = [v for _, v in pairs]
+
+    def __str__(self) -> str:
+        return str(self.to_row_vector())
+
+    def __repr__(self) -> str:
+        return f"SparseRowVector({self._length}, {{{', '.join(f'{c}: {v}' for c, v in self.items())}}})"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __add__(self, other: "SparseRowVector") -> "SparseRowVector":
+        return self._combine(other, 1)
+
+    def __sub__(self, other: "SparseRowVector") -> "SparseRowVector":
+        return self._combine(other, -1)
+
+    def __mul__(self, multiplier: Real) -> "SparseRowVector":
+        multiplier = _to_fraction(multiplier)
+        if multiplier == 0:
+            return self._from_pairs(self._length, [], [])
+        return self._from_pairs(self._length, list(self._cols), [v * multiplier for v in self._values])
+
+    def __truediv__(self, divisor: Real) -> "SparseRowVector":
+        assert divisor != 0
+        divisor = _to_fraction(divisor)
+        return self._from_pairs(self._length, list(self._cols), [v / divisor for v in self._values])
+
+    def __getitem__(self, index: int) -> Fraction:
+        i = bisect_left(self._cols, index)
+        return self._values[i] if i < len(self._cols) and self._cols[i] == index else Fraction(0)
+
+    @classmethod
+    def _from_pairs(cls, length: int, cols: list[int], values: list[Fraction]) -> "SparseRowVector":
+        vector = cls.__new__(cls)
+        vector._length, vector._cols, vector._values = length, cols, values
+        return vector
+
+    def _combine(self, other: "SparseRowVector", factor: Fraction) -> "SparseRowVector":
+        # self + factor * other, merging the 2 sorted column lists
+        assert len(self) == len(other)
+        a_cols, a_values, b_cols, b_values = self._cols, self._values, other._cols, other._values
+        cols, values = [], []
+        i, j, n_a, n_b = 0, 0, len(a_cols), len(b_cols)
+        while i < n_a and j < n_b:
+            if a_cols[i] < b_cols[j]:
+                cols.append(a_cols[i])
+                values.append(a_values[i])
+                i += 1
+            elif a_cols[i] > b_cols[j]:
+                cols.append(b_cols[j])
+                values.append(factor * b_values[j])
+                j += 1
+            else:
+                v = a_values[i] + factor * b_values[j]
+                if v:
+                    cols.append(a_cols[i])
+                    values.append(v)
+                i += 1
+                j += 1
+        cols.extend(a_cols[i:])
+        values.extend(a_values[i:])
+        cols.extend(b_cols[j:])
+        values.extend(factor * v for v in b_values[j:])
+        return self._from_pairs(self._length, cols, values)
+
+    def items(self) -> Iterable[tuple[int, Fraction]]:
+        return zip(self._cols, self._values)
+
+    def get_first_nonzero_index(self) -> int:
+        return self._cols[0] if self._cols else self._length
+
+    def is_nonzero(self) -> bool:
+        return len(self._cols) > 0
+
+    def to_row_vector(self) -> RowVector:
+        vector = [Fraction(0)] * self._length
+        for c, v in self.items():
+            vector[c] = v
+        return RowVector._from_fractions(vector)
+
+    @property
+    def nnz(self) -> int:
+        return len(self._cols)
+
+
+class PLU(NamedTuple):
+    # P A = L U with partial pivoting on the first nonzero candidate. Row i of P A is row `perm[i]` of A, `lower[i]`
+    # holds the multipliers L[i][k] for k < min(i, rank), and the rows of `upper` are the nonzero rows of the row
+    # echelon form U, with their pivots in the columns `pivots`.
+    perm: list[int]
+    lower: list[list[Fraction]]
+    upper: list[list[Fraction]]
+    pivots: list[int]
+    sign: int
+
+
 class Matrix(object):
+    __slots__ = ("_matrix", "_plu", "_invariants", "_snapshot")
+
     def __init__(self, row: tuple[Real, ...], *rows: tuple[Real, ...]) -> None:
         assert len({len(row), *(len(r) for r in rows)}) == 1
         self._matrix = [RowVector(*r) for r in (row, *rows)]
+        self._plu = self._invariants = self._snapshot = None
 
     def __str__(self) -> str:
         max_len = max((v.get_max_len() for v in self))
@@ -85,28 +398,444 @@ class Matrix(object):
 
     def __setitem__(self, index: int, vector: RowVector) -> None:
         self._matrix[index] = vector
+        self._plu = self._invariants = self._snapshot = None
 
-    def get_rref(self):
-        matrix = deepcopy(self)
-        for i in range(len(matrix)):
-            matrix = Matrix(
-                *sorted(matrix.matrix, key=lambda x: x.get_first_nonzero_index())
-            )
-            if not matrix[i].is_nonzero():
-                break
-            matrix[i] /= matrix[i][matrix[i].get_first_nonzero_index()]
-            for j in range(len(matrix)):
-                if j != i:
-                    matrix[j] -= (
-                        matrix[i] * matrix[j][matrix[i].get_first_nonzero_index()]
-                    )
+    @classmethod
+    def _from_rows(cls, rows: list[RowVector]) -> "Matrix":
+        matrix = cls.__new__(cls)
+        matrix._matrix = rows
+        matrix._plu = matrix._invariants = matrix._snapshot = None
         return matrix
 
+    @classmethod
+    def from_buffers(
+        cls, n_cols: int, numerators: memoryview, denominators: Optional[memoryview] = None
+    ) -> "Matrix":
+        # Row-major numerators and, for non-integer matrices, denominators, from any C-contiguous buffers of machine
+        # integers (array.array, bytearray, NumPy arrays...). The rows are slices of the buffers, without copying.
+        views = []
+        for buffer in (numerators, denominators):
+            if buffer is not None:
+                view = memoryview(buffer)
+                order, fmt = view.format[:-1], view.format[-1:]
+                assert order in NATIVE_ORDERS, "The buffers must be in native byte order."
+                assert fmt in INT_FORMATS, "The buffers must hold integers."
+                itemsize = view.itemsize
+                view = view.cast("B").cast(fmt)
+                assert view.itemsize == itemsize, "The buffers must hold integers of native size."
+                assert len(view) > 0 and len(view) % n_cols == 0
+                views.append(view)
+        assert len(views) == 1 or len(views[0]) == len(views[1])
+        nums, dens = views[0], views[1] if len(views) > 1 else None
+        return cls._from_rows([
+            PackedRowVector(nums[i:i + n_cols], None if dens is None else dens[i:i + n_cols])
+            for i in range(0, len(nums), n_cols)
+        ])
+
+    @classmethod
+    def _from_buffer(cls, buffer: list[Fraction], n_cols: int) -> "Matrix":
+        # Build a matrix from a row-major list of fractions, without parsing them again
+        return cls._from_rows(
+            [RowVector._from_fractions(buffer[i:i + n_cols]) for i in range(0, len(buffer), n_cols)]
+        )
+
+    def _get_int_buffer(self) -> tuple[list[int], list[int]]:
+        # Row-major integers where row i holds its entries times its common denominator `dens[i]`
+        buffer, dens = [], []
+        for row in self:
+            nums, row_dens = row._get_pairs()
+            den = lcm(*row_dens)
+            buffer.extend(n if d == den else n * (den // d) for n, d in zip(nums, row_dens))
+            dens.append(den)
+        return buffer, dens
+
+    def _reduce_fraction(self) -> "Matrix":
+        # Gauss-Jordan elimination in place on a row-major buffer of integers over per-row denominators, so that row
+        # operations are integer multiply-adds with 1 gcd per row instead of 1 per entry. Pivots are found by
+        # scanning their column, and entries known to be 0 are skipped.
+        n_rows, n_cols = len(self), len(self[0])
+        buffer, dens = self._get_int_buffer()
+        rank = 0
+        for col in range(n_cols):
+            if rank == n_rows:
+                break
+            pivot_row = next((i for i in range(rank, n_rows) if buffer[i * n_cols + col]), None)
+            if pivot_row is None:
+                continue
+            top, start = rank * n_cols, pivot_row * n_cols
+            if pivot_row != rank:
+                buffer[top:top + n_cols], buffer[start:start + n_cols] = (
+                    buffer[start:start + n_cols], buffer[top:top + n_cols]
+                )
+
+            # Normalize the pivot row, whose entries left of the pivot are all 0, by making the pivot its denominator
+            pivot = buffer[top + col]
+            g = gcd(*buffer[top + col:top + n_cols]) * (-1 if pivot < 0 else 1)
+            for k in range(top + col, top + n_cols):
+                buffer[k] //= g
+            pivot = dens[rank] = pivot // g
+            nonzero = [k for k in range(col + 1, n_cols) if buffer[top + k]]
+
+            # Eliminate the pivot column from every other row
+            for i, row in enumerate(range(0, n_rows * n_cols, n_cols)):
+                factor = buffer[row + col]
+                if row == top or not factor:
+                    continue
+                if pivot != 1:
+                    for k in range(row, row + n_cols):
+                        buffer[k] *= pivot
+                for k in nonzero:
+                    buffer[row + k] -= factor * buffer[top + k]
+                buffer[row + col] = 0
+                den = dens[i] * pivot
+                g = gcd(den, *buffer[row:row + n_cols])
+                if g > 1:
+                    for k in range(row, row + n_cols):
+                        buffer[k] //= g
+                dens[i] = den // g
+            rank += 1
+        return Matrix._from_buffer(
+            [Fraction(buffer[i * n_cols + k], dens[i]) for i in range(n_rows) for k in range(n_cols)], n_cols
+        )
+
+    def _reduce_bareiss(self) -> tuple[list[int], int, int, Fraction]:
+        # Fraction-free Gauss-Jordan elimination (Bareiss): every update (pivot * a - factor * b) // previous pivot
+        # is an exact integer division, and the buffer ends as the last pivot times the RREF. Rows are first scaled
+        # to integers, which the determinant undoes. Returns the buffer, the last pivot, the rank and the
+        # determinant (0 unless the matrix is square and full rank).
+        n_rows, n_cols = len(self), len(self[0])
+        buffer, dens = self._get_int_buffer()
+        prev, rank, sign = 1, 0, 1
+        for col in range(n_cols):
+            if rank == n_rows:
+                break
+            pivot_row = next((i for i in range(rank, n_rows) if buffer[i * n_cols + col]), None)
+            if pivot_row is None:
+                continue
+            top, start = rank * n_cols, pivot_row * n_cols
+            if pivot_row != rank:
+                buffer[top:top + n_cols], buffer[start:start + n_cols] = (
+                    buffer[start:start + n_cols], buffer[top:top + n_cols]
+                )
+                sign = -sign
+            pivot = buffer[top + col]
+
+            # Rows below the pivot row are 0 left of the pivot column; rows above are not, but the pivot row is
+            for row in range(0, n_rows * n_cols, n_cols):
+                if row == top:
+                    continue
+                factor = buffer[row + col]
+                for k in range(0 if row < top else col + 1, n_cols):
+                    a, b = buffer[row + k], buffer[top + k]
+                    if a or b:
+                        buffer[row + k] = (pivot * a - factor * b) // prev
+                buffer[row + col] = 0
+            prev = pivot
+            rank += 1
+
+        determinant = Fraction(0)
+        if rank == n_rows == n_cols:
+            scale = 1
+            for den in dens:
+                scale *= den
+            determinant = Fraction(sign * prev, scale)
+        return buffer, prev, rank, determinant
+
+    def _reduce_float(self, tol: float) -> "Matrix":
+        # Floats are rendered as the closest fractions with a bounded denominator, as the exact backends would
+        reduced = batch_rref([[[float(v) for v in row] for row in self]], tol)[0]
+        return Matrix._from_buffer(
+            [Fraction(v).limit_denominator(MAX_DENOMINATOR) for v in reduced.ravel().tolist()], len(self[0])
+        )
+
+    def _reduce_modular(self, workers: Optional[int]) -> "Matrix":
+        # The RREF of the rows scaled to integers is computed modulo word-size primes, 1 prime per worker and
+        # round, and combined by CRT. Primes where the pivots are worse (a lower rank, or later columns) are
+        # unlucky and dropped. After every round, the entries are rationally reconstructed, and the first
+        # candidate that passes the exact certificate below is the result.
+        n_rows, n_cols = len(self), len(self[0])
+        buffer, _ = self._get_int_buffer()
+        primes = _iter_primes()
+        best, residues, modulus = None, [], 1
+        workers = os.cpu_count() if workers is None else workers
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            while True:
+                batch = [next(primes) for _ in range(workers)]
+                args = ([[v % p for v in buffer] for p in batch], [n_cols] * len(batch), batch)
+                results = executor.map(_rref_mod, *args) if executor else map(_rref_mod, *args)
+                for p, (pivots, reduced) in zip(batch, results):
+                    key = (-len(pivots), pivots)
+                    if best is None or key < best:
+                        best, residues, modulus = key, reduced, p
+                    elif key == best:
+                        m_inv = pow(modulus, -1, p)
+                        residues = [x + modulus * ((r - x) * m_inv % p) for x, r in zip(residues, reduced)]
+                        modulus *= p
+
+                values = _reconstruct_all(residues, modulus)
+                if values is not None:
+                    pivots = best[1]
+                    free = [col for col in range(n_cols) if col not in set(pivots)]
+                    rref = [Fraction(0)] * (n_rows * n_cols)
+                    for i, col in enumerate(pivots):
+                        rref[i * n_cols + col] = Fraction(1)
+                        for j, c in enumerate(free):
+                            rref[i * n_cols + c] = values[i * len(free) + j]
+                    if self._certify_rref(buffer, pivots, rref[:len(pivots) * n_cols]):
+                        return Matrix._from_buffer(rref, n_cols)
+        finally:
+            if executor:
+                executor.shutdown()
+
+    @staticmethod
+    def _certify_rref(buffer: list[int], pivots: list[int], rref: list[Fraction]) -> bool:
+        # R holds the identity in the pivot columns P by construction; with 0 left of every pivot, it is in RREF.
+        # Then with the integer rows A, A = A[:, P] R shows that the rows of R span those of A. The rank modulo a
+        # prime is at most the rank of A, so that R has no more rows than A has rank: both span the same space, and
+        # R is the RREF of A.
+        if not pivots:
+            return not any(buffer)
+        n_cols = len(rref) // len(pivots)
+        if any(rref[i * n_cols + c] for i, pivot in enumerate(pivots) for c in range(pivot)):
+            return False
+        den = lcm(*(v.denominator for v in rref))
+        scaled = [v.numerator * (den // v.denominator) for v in rref]
+        rows = [scaled[i:i + n_cols] for i in range(0, len(scaled), n_cols)]
+        for start in range(0, len(buffer), n_cols):
+            row = buffer[start:start + n_cols]
+            combination = [0] * n_cols
+            for c, r in zip(pivots, rows):
+                factor = row[c]
+                if factor:
+                    combination = [a + factor * b for a, b in zip(combination, r)]
+            if combination != [den * v for v in row]:
+                return False
+        return True
+
+    def get_rref(
+        self, backend: str = "fraction", tol: float = TOLERANCE, workers: Optional[int] = None
+    ) -> "Matrix":
+        assert backend in BACKENDS, f"`backend` must be one of {BACKENDS}, got {backend!r}."
+        if backend == "fraction":
+            return self._reduce_fraction()
+        elif backend == "float":
+            return self._reduce_float(tol)
+        elif backend == "modular":
+            return self._reduce_modular(workers)
+
+        # The rank and determinant come with the Bareiss pass, so they are cached with the rows they were computed on
+        self._check_cache()
+        snapshot = [list(row) for row in self] if self._snapshot is None else self._snapshot
+        buffer, den, rank, determinant = self._reduce_bareiss()
+        self._invariants, self._snapshot = (rank, determinant), snapshot
+        return Matrix._from_buffer([Fraction(v, den) for v in buffer], len(self[0]))
+
+    def _check_cache(self) -> None:
+        # Rows can also be edited in place, through RowVector.__setitem__ or the buffers of packed rows, so the cache
+        # is only kept while the rows still equal the snapshot taken when it was filled. Unchanged entries are the
+        # same Fraction objects, which list comparison matches by identity.
+        if self._snapshot is not None and [list(row) for row in self] != self._snapshot:
+            self._plu = self._invariants = self._snapshot = None
+
+    def get_plu(self) -> PLU:
+        # Computed once, then cached until a row is replaced or edited
+        self._check_cache()
+        if self._plu is not None:
+            return self._plu
+        n_rows, n_cols = len(self), len(self[0])
+        if self._snapshot is None:
+            self._snapshot = [list(row) for row in self]
+        rows = [list(row) for row in self._snapshot]
+        perm, lower, pivots, sign = list(range(n_rows)), [[] for _ in range(n_rows)], [], 1
+        for col in range(n_cols):
+            rank = len(pivots)
+            if rank == n_rows:
+                break
+            pivot_row = next((i for i in range(rank, n_rows) if rows[i][col]), None)
+            if pivot_row is None:
+                continue
+            if pivot_row != rank:
+                for a in (rows, perm, lower):
+                    a[rank], a[pivot_row] = a[pivot_row], a[rank]
+                sign = -sign
+            top = rows[rank]
+            nonzero = [k for k in range(col + 1, n_cols) if top[k]]
+            for i in range(rank + 1, n_rows):
+                row, factor = rows[i], rows[i][col]
+                if factor:
+                    factor /= top[col]
+                    for k in nonzero:
+                        row[k] -= factor * top[k]
+                    row[col] = Fraction(0)
+                lower[i].append(factor)
+            pivots.append(col)
+        self._plu = PLU(perm, lower, rows[:len(pivots)], pivots, sign)
+        return self._plu
+
+    def rank(self) -> int:
+        # From a previous Bareiss reduction if any, otherwise from the PLU factorization
+        self._check_cache()
+        if self._invariants is not None:
+            return self._invariants[0]
+        return len(self.get_plu().pivots)
+
+    def determinant(self) -> Fraction:
+        assert len(self) == len(self[0]), "The matrix must be square."
+        self._check_cache()
+        if self._invariants is not None:
+            return self._invariants[1]
+        plu = self.get_plu()
+        if len(plu.pivots) < len(self):
+            return Fraction(0)
+        determinant = Fraction(plu.sign)
+        for i, row in enumerate(plu.upper):
+            determinant *= row[i]
+        return determinant
+
+    @staticmethod
+    def _back_substitute(plu: PLU, y: list[Fraction], x: list[Fraction]) -> list[Fraction]:
+        # Solve U x = y for the pivot variables, given the free variables already set in `x`
+        upper, pivots = plu.upper, plu.pivots
+        for i in range(len(pivots) - 1, -1, -1):
+            row, col = upper[i], pivots[i]
+            total = y[i]
+            for k in range(col + 1, len(row)):
+                if row[k] and x[k]:
+                    total -= row[k] * x[k]
+            x[col] = total / row[col]
+        return x
+
+    def solve(self, b: Sequence[Real]) -> RowVector:
+        # A particular solution of A x = b, with every free variable set to 0, in O(n^2) once factorized
+        assert len(b) == len(self)
+        plu = self.get_plu()
+        b = RowVector(*b).vector
+        y = [b[p] for p in plu.perm]
+        for i, multipliers in enumerate(plu.lower):
+            for k, m in enumerate(multipliers):
+                if m and y[k]:
+                    y[i] -= m * y[k]
+        if any(y[len(plu.pivots):]):
+            raise ValueError("The system has no solution.")
+        return RowVector._from_fractions(self._back_substitute(plu, y, [Fraction(0)] * len(self[0])))
+
+    def solve_many(self, b: "Matrix") -> "Matrix":
+        # Every row of `b` is a right-hand side, and the rows of the result are the matching solutions
+        return Matrix._from_rows([self.solve(row) for row in b])
+
+    def nullspace(self) -> list[RowVector]:
+        # 1 basis vector per free column, with that variable set to 1 and the other free variables to 0
+        plu = self.get_plu()
+        n_cols, pivots = len(self[0]), set(plu.pivots)
+        basis = []
+        for free in range(n_cols):
+            if free not in pivots:
+                x = [Fraction(0)] * n_cols
+                x[free] = Fraction(1)
+                basis.append(RowVector._from_fractions(self._back_substitute(plu, [Fraction(0)] * len(pivots), x)))
+        return basis
+
+    def inverse(self) -> "Matrix":
+        n = len(self)
+        assert n == len(self[0]), "The matrix must be square."
+        if self.rank() < n:
+            raise ValueError("The matrix is not invertible.")
+        columns = [self.solve([int(i == j) for j in range(n)]) for i in range(n)]
+        return Matrix._from_rows([RowVector._from_fractions([c[i] for c in columns]) for i in range(n)])
+
     @property
     def matrix(self) -> list[RowVector]:
         return self._matrix
 
 
+class SparseMatrix(object):
+    __slots__ = ("_n_cols", "_matrix")
+
+    def __init__(self, n_cols: int, *rows: Union[Mapping[int, Real], Iterable[tuple[int, Real]]]) -> None:
+        assert len(rows) > 0
+        self._n_cols = n_cols
+        self._matrix = [SparseRowVector(n_cols, r) for r in rows]
+
+    def __str__(self) -> str:
+        return str(self.to_matrix())
+
+    def __repr__(self) -> str:
+        rows = (f"{{{', '.join(f'{c}: {v}' for c, v in r.items())}}}" for r in self)
+        return f"SparseMatrix({self._n_cols}, {', '.join(rows)})"
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def __getitem__(self, index: int) -> SparseRowVector:
+        return self.matrix[index]
+
+    @classmethod
+    def from_matrix(cls, matrix: Matrix) -> "SparseMatrix":
+        sparse = cls.__new__(cls)
+        sparse._n_cols = len(matrix[0])
+        sparse._matrix = [
+            SparseRowVector._from_pairs(
+                sparse._n_cols, [c for c, v in enumerate(r) if v], [v for v in r if v]
+            )
+            for r in matrix
+        ]
+        return sparse
+
+    def to_matrix(self) -> Matrix:
+        return Matrix._from_rows([r.to_row_vector() for r in self])
+
+    def get_rref(self) -> "SparseMatrix":
+        # Rows that are not pivot rows yet are bucketed by their cached leading index, and the columns are visited
+        # in order through a heap of the leading indices. The pivot of a column is the candidate row with the
+        # fewest nonzeros, which limits the fill-in of the other candidates it is subtracted from.
+        rows = list(self)
+        buckets = {}
+        for i, row in enumerate(rows):
+            if row.is_nonzero():
+                buckets.setdefault(row.get_first_nonzero_index(), []).append(i)
+        heap = list(buckets)
+        heapq.heapify(heap)
+        pivots = []
+        while heap:
+            col = heapq.heappop(heap)
+            bucket = buckets.pop(col)
+            p = min(bucket, key=lambda i: rows[i].nnz)
+            pivot = rows[p] = rows[p] / rows[p]._values[0]
+            pivots.append(p)
+            for i in bucket:
+                if i == p:
+                    continue
+                row = rows[i] = rows[i]._combine(pivot, -rows[i]._values[0])
+                if row.is_nonzero():
+                    lead = row.get_first_nonzero_index()
+                    if lead not in buckets:
+                        buckets[lead] = []
+                        heapq.heappush(heap, lead)
+                    buckets[lead].append(i)
+
+        # Back substitution from the last pivot row up: the rows below are already reduced, so that subtracting
+        # them never brings back an entry in another pivot column
+        pivot_rows = {rows[p].get_first_nonzero_index(): p for p in pivots}
+        for p in reversed(pivots):
+            for c, v in [(c, v) for c, v in rows[p].items() if c in pivot_rows and pivot_rows[c] != p]:
+                rows[p] = rows[p]._combine(rows[pivot_rows[c]], -v)
+
+        sparse = SparseMatrix.__new__(SparseMatrix)
+        sparse._n_cols = self._n_cols
+        zero = SparseRowVector._from_pairs(self._n_cols, [], [])
+        sparse._matrix = [rows[p] for p in pivots] + [zero] * (len(rows) - len(pivots))
+        return sparse
+
+    @property
+    def matrix(self) -> list[SparseRowVector]:
+        return self._matrix
+
+    @property
+    def nnz(self) -> int:
+        return sum(r.nnz for r in self)
+
+
 if __name__ == "__main__":
     # Source: CUHK ENGG1120 Spring 2022 Assignments
     test_cases = (
@@ -166,5 +895,8 @@ if __name__ == "__main__":
         ),
     )
 
+    backends = BACKENDS if find_spec("numpy") is not None else ("fraction", "bareiss")
     for test_matrix, test_rref in test_cases:
-        assert repr(Matrix(*test_matrix).get_rref()) == test_rref
+        for backend in backends:
+            assert repr(Matrix(*test_matrix).get_rref(backend, workers=1)) == test_rref
+        assert repr(SparseMatrix.from_matrix(Matrix(*test_matrix)).get_rref().to_matrix()) == test_rref
@@ -11,79 +11,458 @@ simple-term-menu
 ### Usage:
 
 ```bash
-python simple_blackjack.py [-s SEED]
+python simple_blackjack.py [-s SEED] [-d DECKS]
+python simple_blackjack.py -n HANDS [-s SEED] [-d DECKS] [-pe PENETRATION] [-po POLICY] [-w WORKERS] [-b]
 ```
+
+With `-n`, no one plays: `HANDS` hands are simulated headlessly under the
+same rules, with the given player policy in place of the menu, and the win,
+push and loss rates are printed with their confidence intervals. With `-b`
+(requires `numpy`), hands are played as arrays, `LANES` shoes at a time.
 """
 
 import argparse
 import random
-import sys
-from itertools import product
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from math import sqrt
+from typing import Callable, NamedTuple, Optional
 
 from simple_term_menu import TerminalMenu
 
 CARD_DECK = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"] * 16
 PICTURE_CARDS = {"J", "Q", "K"}
+CARD_VALUES = {card: 1 if card == "A" else 10 if card in PICTURE_CARDS else int(card) for card in CARD_DECK}
+RANKS = tuple(CARD_DECK[:13])
+CHUNK_SIZE = 1 << 16
+LANES = 1 << 10
+OUTCOMES = {1: "win", 0: "push", -1: "loss"}
+DEALER_TOTALS = (18, 19, 20, 21, 22)  # Final totals of the dealer, who always hits 17; 22 stands for any bust
+
+
+class EVTable(NamedTuple):
+    # Expected outcome of standing, `stand[up][total]`, and of hitting then playing on optimally,
+    # `hit[up][soft][total]`, indexed by the value of the dealer's up-card (1 for an ace) and the player's total
+    stand: list[list[float]]
+    hit: list[list[list[float]]]
+
+
+class Hand(object):
+    # Aces are counted as 1 in `hard_total`; at most 1 of them can ever count as 11, which is then a soft hand
+    __slots__ = ("cards", "hard_total", "n_aces")
+
+    def __init__(self, *cards: str) -> None:
+        self.cards, self.hard_total, self.n_aces = [], 0, 0
+        for card in cards:
+            self.add(card)
+
+    def __str__(self) -> str:
+        return ", ".join(self.cards)
+
+    def __repr__(self) -> str:
+        return f"Hand({', '.join(map(repr, self.cards))})"
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def add(self, card: str) -> None:
+        value = CARD_VALUES[card]
+        self.cards.append(card)
+        self.hard_total += value
+        self.n_aces += value == 1
+
+    @property
+    def total(self) -> int:
+        return self.hard_total + 10 if self.is_soft else self.hard_total
+
+    @property
+    def is_soft(self) -> bool:
+        return self.n_aces > 0 and self.hard_total <= 11
+
+    @property
+    def is_blackjack(self) -> bool:
+        return len(self.cards) == 2 and self.total == 21
+
+    @property
+    def is_bust(self) -> bool:
+        return self.hard_total > 21
+
+
+class Shoe(object):
+    # Cards are stored as rank indices in a byte array and dealt by advancing a cursor, so that the same shoe is
+    # reshuffled in place and reused across hands. The cut card sits after `penetration` of the shoe.
+    __slots__ = ("_cards", "_cursor", "_cut", "_rng")
+
+    def __init__(self, n_decks: int = 4, penetration: float = 1.0, rng: Optional[random.Random] = None) -> None:
+        if n_decks < 1:
+            raise ValueError(f"`n_decks` must be at least 1, got {n_decks}.")
+        if not 0 < penetration <= 1:
+            raise ValueError(f"`penetration` must be in (0, 1], got {penetration}.")
+        self._cards = array("B", range(len(RANKS))) * (4 * n_decks)
+        self._cut = max(1, int(len(self._cards) * penetration))
+        self._rng = random if rng is None else rng
+        self.shuffle()
+
+    def __len__(self) -> int:
+        return len(self._cards) - self._cursor
+
+    def shuffle(self) -> None:
+        # random.shuffle is an in-place Fisher-Yates shuffle over any mutable sequence
+        self._rng.shuffle(self._cards)
+        self._cursor = 0
+
+    def deal(self) -> str:
+        if self._cursor == len(self._cards):
+            self.shuffle()
+        card = self._cards[self._cursor]
+        self._cursor += 1
+        return RANKS[card]
+
+    @property
+    def needs_shuffle(self) -> bool:
+        return self._cursor >= self._cut
+
+
+class DealerSolver(object):
+    # Exact distribution of the dealer's final total over a finite shoe, given the up-card and the player's total.
+    # `counts[v - 1]` is the number of cards of value v. The remaining cards are encoded as 1 integer in mixed radix,
+    # which also determines the dealer's cards drawn so far, so that it is the whole memo key with the threshold.
+    def __init__(self, counts: list[int]) -> None:
+        self._counts = list(counts)
+        self._radix = [1] * len(counts)
+        for i in range(1, len(counts)):
+            self._radix[i] = self._radix[i - 1] * (counts[i - 1] + 1)
+        self._key = sum(c * r for c, r in zip(counts, self._radix))
+        self._memo = {}
+
+    def distribution(self, up_card: int, player_total: int) -> tuple[float, ...]:
+        # Probabilities of the final totals in DEALER_TOTALS
+        threshold = max(player_total, 17)
+        self._counts[up_card - 1] -= 1
+        try:
+            return self._draw(
+                self._key - self._radix[up_card - 1], sum(self._counts), up_card, up_card == 1, threshold
+            )
+        finally:
+            self._counts[up_card - 1] += 1
+
+    def _draw(self, key: int, remaining: int, hard: int, ace: bool, threshold: int) -> tuple[float, ...]:
+        total = hard + 10 if ace and hard <= 11 else hard
+        if total > threshold or total >= 21:
+            return _FINAL_TOTALS[min(total, 22) - 18]
+        memo_key = key * 5 + threshold - 17
+        dist = self._memo.get(memo_key)
+        if dist is not None:
+            return dist
+        dist = [0.0] * len(DEALER_TOTALS)
+        counts = self._counts
+        for i, c in enumerate(counts):
+            if c == 0:
+                continue
+            counts[i] -= 1
+            sub = self._draw(key - self._radix[i], remaining - 1, hard + i + 1, ace or i == 0, threshold)
+            counts[i] += 1
+            p = c / remaining
+            for j, q in enumerate(sub):
+                dist[j] += p * q
+        self._memo[memo_key] = dist = tuple(dist)
+        return dist
+
+
+_FINAL_TOTALS = tuple(tuple(float(i == j) for j in range(len(DEALER_TOTALS))) for i in range(len(DEALER_TOTALS)))
+
+
+@lru_cache(maxsize=None)
+def get_ev_tables(n_decks: int = 4) -> EVTable:
+    # The dealer's draws are exact over the shoe without the up-card; the player's draws are taken from the same
+    # composition, without removing the player's own cards
+    counts = [0] * 10
+    for card in CARD_DECK[:13]:
+        counts[CARD_VALUES[card] - 1] += 4 * n_decks
+    solver = DealerSolver(counts)
+    stand = [[0.0] * 22 for _ in range(11)]
+    hit = [[[0.0] * 22 for _ in range(2)] for _ in range(11)]
+    for up in range(1, 11):
+        for total in range(4, 22):
+            dist = solver.distribution(up, total)
+            stand[up][total] = dist[-1] - sum(p for t, p in zip(DEALER_TOTALS, dist[:-1]) if t != total)
+
+        # Hard totals only ever grow, so that every state is solved after those it can reach
+        remaining = sum(counts) - 1
+        draws = [(v, (counts[v - 1] - (v == up)) / remaining) for v in range(1, 11)]
+        best = [[0.0] * 22 for _ in range(2)]
+        for hard in range(21, 1, -1):
+            for soft in (True, False) if hard <= 11 else (False,):
+                total = hard + 10 if soft else hard
+                ev = 0.0
+                for v, p in draws:
+                    new_hard = hard + v
+                    if new_hard > 21:
+                        ev -= p
+                    else:
+                        new_soft = (soft or v == 1) and new_hard <= 11
+                        ev += p * best[new_soft][new_hard + 10 if new_soft else new_hard]
+                if total <= 21:
+                    hit[up][soft][total] = ev
+                    stand_ev = stand[up][total]
+                    best[soft][total] = stand_ev if total == 21 else max(stand_ev, ev)
+    return EVTable(stand, hit)
 
 
 def get_cards_sum(cards: list[str]) -> int:
-    total, n_ace = 0, 0
-    for card in cards:
-        if card == "A":
-            n_ace += 1
-        else:
-            total += 10 if card in PICTURE_CARDS else int(card)
-    aces = map(sum, product((1, 11), repeat=n_ace))
-    combs = tuple(filter(lambda x: x <= 21, map(lambda a: a + total, aces)))
-    return max(combs) if len(combs) else 22
+    hand = Hand(*cards)
+    return 22 if hand.is_bust else hand.total
+
+
+Policy = Callable[[Hand, str], bool]  # Whether to hit, given the player's hand and the dealer's up-card
+
+
+def stand(hand: Hand, up_card: str) -> bool:
+    return False
+
+
+def cautious(hand: Hand, up_card: str) -> bool:
+    return hand.total < 12
+
+
+def mimic_dealer(hand: Hand, up_card: str) -> bool:
+    return hand.total < 17
+
+
+def optimal(hand: Hand, up_card: str, n_decks: int = 4) -> bool:
+    table, up = get_ev_tables(n_decks), CARD_VALUES[up_card]
+    return table.hit[up][hand.is_soft][hand.total] > table.stand[up][hand.total]
+
 
+POLICIES: dict[str, Policy] = {"stand": stand, "cautious": cautious, "dealer": mimic_dealer, "optimal": optimal}
 
-def main() -> None:
-    ordered_deck = random.sample(CARD_DECK, len(CARD_DECK))
-    player_cards, dealer_cards = [], []
+
+def get_policy(name: str, n_decks: int = 4) -> Policy:
+    # The optimal policy is solved for the shoe it plays from; the others do not depend on it
+    return partial(optimal, n_decks=n_decks) if name == "optimal" else POLICIES[name]
+
+
+def _get_hit_table(policy: Policy) -> list[list[list[bool]]]:
+    # Decisions of `policy` as `table[up][soft][total]`, from a representative hand of every (total, soft) pair,
+    # which holds for any policy of the total, softness and up-card only. Totals up to 31 index busted hands.
+    table = [[[False] * 32 for _ in range(2)] for _ in range(11)]
+    for hard in range(2, 21):
+        for soft in (True, False) if hard <= 11 else (False,):
+            if soft:
+                hand = Hand("A", RANKS[hard - 2])
+            elif hard >= 4:
+                hand = Hand(RANKS[hard - 11], "10") if hard >= 12 else Hand(RANKS[hard - 3], "2")
+            else:
+                continue
+            for up in range(1, 11):
+                table[up][soft][hand.total] = policy(hand, RANKS[up - 1])
+    return table
+
+
+def play_hand(shoe: Shoe, policy: Policy, verbose: bool = False) -> int:
+    # 1 if the player wins, 0 on a push, -1 if the player loses
+    player, dealer = Hand(), Hand()
     for _ in range(2):
-        player_cards.append(ordered_deck.pop(0))
-        dealer_cards.append(ordered_deck.pop(0))
-    
+        player.add(shoe.deal())
+        dealer.add(shoe.deal())
+
     # Initial cards
-    player_sum, dealer_sum = get_cards_sum(player_cards), get_cards_sum(dealer_cards)
-    print(f"Your hand value is {player_sum} ({', '.join(player_cards)}).")
-    print(f"Dealer has ? and {dealer_cards[1]}.")
+    if verbose:
+        print(f"Your hand value is {player.total} ({player}).")
+        print(f"Dealer has ? and {dealer.cards[1]}.")
 
     # Blackjack
-    if player_sum == 21:
-        print(f"Dealer's hand value is {dealer_sum} ({', '.join(dealer_cards)}).")
-        print("Push!" if dealer_sum == 21 else "Blackjack! You won!")
-        sys.exit(0)
+    if player.is_blackjack:
+        if verbose:
+            print(f"Dealer's hand value is {dealer.total} ({dealer}).")
+            print("Push!" if dealer.is_blackjack else "Blackjack! You won!")
+        return 0 if dealer.is_blackjack else 1
 
     # Player's turn
-    while player_sum < 21:
-        choice = TerminalMenu(("Stand", "Hit")).show()
-        if choice:
-            player_cards.append(ordered_deck.pop(0))
-            player_sum = get_cards_sum(player_cards)
-            print(f"You hit.\nYour hand value is {player_sum} ({', '.join(player_cards)}).")
+    while player.total < 21:
+        if policy(player, dealer.cards[1]):
+            player.add(shoe.deal())
+            if verbose:
+                print(f"You hit.\nYour hand value is {player.total} ({player}).")
         else:
-            print(f"You stood.")
+            if verbose:
+                print(f"You stood.")
             break
     else:
-        if player_sum > 21:
-            print("You busted!")
-            sys.exit(0)
+        if player.is_bust:
+            if verbose:
+                print("You busted!")
+            return -1
 
     # Dealer's turn
-    print(f"Dealer's hand value is {dealer_sum} ({', '.join(dealer_cards)}).")
-    while dealer_sum <= max(player_sum, 17) and dealer_sum < 21:
-        dealer_cards.append(ordered_deck.pop(0))
-        dealer_sum = get_cards_sum(dealer_cards)
-        print(f"Dealer hit.\nDealer's hand value is {dealer_sum} ({', '.join(dealer_cards)}).")
+    if verbose:
+        print(f"Dealer's hand value is {dealer.total} ({dealer}).")
+    while dealer.total <= max(player.total, 17) and dealer.total < 21:
+        dealer.add(shoe.deal())
+        if verbose:
+            print(f"Dealer hit.\nDealer's hand value is {dealer.total} ({dealer}).")
+    if player.total == dealer.total:
+        outcome = 0
+    elif dealer.is_bust:
+        outcome = 1
     else:
-        if player_sum == dealer_sum:
-            print("Push!")
-        elif dealer_sum > 21:
-            print("Dealer busted! You won!")
-        else:
-            print("You lost!")
+        outcome = -1
+    if verbose:
+        print(("You lost!", "Push!", "Dealer busted! You won!")[outcome + 1])
+    return outcome
+
+
+def _simulate_batch(policy: str, n_decks: int, penetration: float, hands: int, seed: str) -> Counter:
+    import numpy as np
+
+    # Every lane deals from its own shoe of card values, as in `_simulate_chunk`, and all lanes play 1 hand at a time
+    # in lock-step: the hit loops are masked steps until every lane stands or busts
+    rng = np.random.default_rng(random.Random(seed).getrandbits(128))
+    lanes = min(LANES, hands)
+    deck = np.array([CARD_VALUES[card] for card in RANKS] * (4 * n_decks), dtype=np.int8)
+    size, cut = len(deck), max(1, int(len(deck) * penetration))
+    shoes = rng.permuted(np.broadcast_to(deck, (lanes, size)), axis=1)
+    cursor = np.zeros(lanes, dtype=np.intp)
+    rows = np.arange(lanes)
+    hit_table = np.array(_get_hit_table(get_policy(policy, n_decks)), dtype=bool)
+
+    def shuffle(mask: "np.ndarray") -> None:
+        shoes[mask] = rng.permuted(shoes[mask], axis=1)
+        cursor[mask] = 0
+
+    def deal(mask: "np.ndarray") -> "np.ndarray":
+        # Value of the next card of every lane, only advancing the lanes in `mask`
+        cards = shoes[rows, cursor]
+        cursor[mask] += 1
+        if (cursor == size).any():
+            shuffle(cursor == size)
+        return np.where(mask, cards, 0)
+
+    def get_total(hard: "np.ndarray", aces: "np.ndarray") -> "np.ndarray":
+        return np.where((aces > 0) & (hard <= 11), hard + 10, hard)
+
+    everyone = np.ones(lanes, dtype=bool)
+    outcomes = Counter()
+    for start in range(0, hands, lanes):
+        player_hard, dealer_hard = np.zeros(lanes, dtype=np.int64), np.zeros(lanes, dtype=np.int64)
+        player_aces, dealer_aces = np.zeros(lanes, dtype=np.int64), np.zeros(lanes, dtype=np.int64)
+        for _ in range(2):
+            card = deal(everyone)
+            player_hard += card
+            player_aces += card == 1
+            up = deal(everyone)
+            dealer_hard += up
+            dealer_aces += up == 1
+
+        # Blackjack
+        player_total, dealer_total = get_total(player_hard, player_aces), get_total(dealer_hard, dealer_aces)
+        blackjack = player_total == 21
+        outcome = np.where(dealer_total == 21, 0, 1)
+
+        # Player's turn
+        active = ~blackjack
+        while True:
+            active &= player_total < 21
+            active &= hit_table[up, ((player_aces > 0) & (player_hard <= 11)).view(np.int8), player_total]
+            if not active.any():
+                break
+            card = deal(active)
+            player_hard += card
+            player_aces += card == 1
+            player_total = get_total(player_hard, player_aces)
+        busted = player_hard > 21
+
+        # Dealer's turn
+        active = ~blackjack & ~busted
+        while True:
+            active &= (dealer_total <= np.maximum(player_total, 17)) & (dealer_total < 21)
+            if not active.any():
+                break
+            card = deal(active)
+            dealer_hard += card
+            dealer_aces += card == 1
+            dealer_total = get_total(dealer_hard, dealer_aces)
+        played = np.where(player_total == dealer_total, 0, np.where(dealer_hard > 21, 1, -1))
+        outcome = np.where(blackjack, outcome, np.where(busted, -1, played))
+
+        # The last round plays every lane but only counts as many hands as are left
+        outcome = outcome[:hands - start]
+        for value in OUTCOMES:
+            outcomes[value] += int(np.count_nonzero(outcome == value))
+        if (cursor >= cut).any():
+            shuffle(cursor >= cut)
+    return outcomes
+
+
+def _simulate_chunk(
+    policy: str, n_decks: int, penetration: float, hands: int, seed: str, batched: bool = False
+) -> Counter:
+    if batched:
+        return _simulate_batch(policy, n_decks, penetration, hands, seed)
+    shoe = Shoe(n_decks, penetration, random.Random(seed))
+    player = get_policy(policy, n_decks)
+    outcomes = Counter()
+    for _ in range(hands):
+        if shoe.needs_shuffle:
+            shoe.shuffle()
+        outcomes[play_hand(shoe, player)] += 1
+    return outcomes
+
+
+def simulate(
+    policy: str = "dealer",
+    hands: int = 1000000,
+    n_decks: int = 4,
+    penetration: float = 0.75,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    batched: bool = False,
+) -> Counter:
+    # Check arguments
+    if policy not in POLICIES:
+        raise ValueError(f"`policy` must be one of {tuple(POLICIES)}, got {policy!r}.")
+    if hands < 1:
+        raise ValueError(f"`hands` must be greater than or equal to 1, got {hands}.")
+
+    # Each chunk deals from a fresh shoe seeded from (seed, chunk index), so reshuffles fall on the same hands
+    # whatever the number of workers
+    seed = random.randrange(1 << 64) if seed is None else seed
+    sizes = [CHUNK_SIZE] * (hands // CHUNK_SIZE) + ([hands % CHUNK_SIZE] if hands % CHUNK_SIZE else [])
+    args = [(policy, n_decks, penetration, size, f"{seed}:{i}", batched) for i, size in enumerate(sizes)]
+    outcomes = Counter()
+    if workers == 1:
+        for arg in args:
+            outcomes.update(_simulate_chunk(*arg))
+        return outcomes
+    with ProcessPoolExecutor(workers) as executor:
+        for result in executor.map(_simulate_chunk, *zip(*args)):
+            outcomes.update(result)
+    return outcomes
+
+
+def get_rates(outcomes: Counter, z: float = 1.96) -> dict[str, tuple[float, float]]:
+    # Rate of each outcome and the player's edge per hand, with the half-width of their normal confidence interval
+    hands = sum(outcomes.values())
+    if hands < 1:
+        raise ValueError(f"`outcomes` must count at least 1 hand, got {hands}.")
+    rates = {}
+    for outcome, name in OUTCOMES.items():
+        p = outcomes[outcome] / hands
+        rates[name] = (p, z * sqrt(p * (1 - p) / hands))
+    edge = (outcomes[1] - outcomes[-1]) / hands
+    variance = (outcomes[1] + outcomes[-1]) / hands - edge ** 2
+    rates["edge"] = (edge, z * sqrt(variance / hands))
+    return rates
+
+
+def main(n_decks: int = 4) -> None:
+    def choose(hand: Hand, up_card: str) -> bool:
+        return bool(TerminalMenu(("Stand", "Hit")).show())
+
+    play_hand(Shoe(n_decks), choose, verbose=True)
 
 
 if __name__ == "__main__":
@@ -92,7 +471,41 @@ if __name__ == "__main__":
         "-s", "--seed", type=int, default=None,
         help="Seed for random number generator. Defaults to None.",
     )
+    parser.add_argument(
+        "-d", "--decks", type=int, default=4,
+        help="Number of 52-card decks in the shoe. Defaults to 4.",
+    )
+    parser.add_argument(
+        "-n", "--hands", type=int, default=None,
+        help="Simulate this many hands headlessly instead of playing. Defaults to None.",
+    )
+    parser.add_argument(
+        "-pe", "--penetration", type=float, default=0.75,
+        help="Fraction of the shoe dealt before it is reshuffled in simulated hands. Defaults to 0.75.",
+    )
+    parser.add_argument(
+        "-po", "--policy", type=str, default="dealer", choices=tuple(POLICIES),
+        help="Player policy of simulated hands. Defaults to dealer.",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None,
+        help="Number of worker processes of simulated hands. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "-b", "--batched", action="store_true",
+        help="Simulate hands as NumPy arrays, many shoes at a time.",
+    )
     args = parser.parse_args()
 
-    random.seed(args.seed)
-    main()
+    if args.hands is None:
+        random.seed(args.seed)
+        main(args.decks)
+    else:
+        start = time.perf_counter()
+        outcomes = simulate(
+            args.policy, args.hands, args.decks, args.penetration, args.seed, args.workers, args.batched
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{args.hands} hands with the {args.policy} policy ({args.hands / elapsed * 60:,.0f} hands/min)")
+        for name, (rate, half_width) in get_rates(outcomes).items():
+            print(f"{name:>5s}: {rate:8.4%} +/- {half_width:.4%}")